@@ -45,4 +45,15 @@ fig, ax_frame, ax_freq_over_row, ax_freq_over_col, ax_row_groups, ax_col_groups
 #                out_path=out_path,
 #                show_fig=True)
 
+# for very large files, the mask can be built directly from the CSV file,
+#   without parsing the values with pd.read_csv
+# from missingdata import read_csv_mask
+# mask, col_labels, row_labels = read_csv_mask(data_path, label_col='DayOfWeek')
+# fig, ax_frame, ax_freq_over_row, ax_freq_over_col, ax_row_groups, ax_col_groups = \
+#     blackholes(mask,
+#                label_rows_with=row_labels,
+#                label_cols_with=col_labels,
+#                out_path=out_path,
+#                show_fig=True)
+
 print()
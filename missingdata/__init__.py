@@ -10,4 +10,15 @@ if version_info.major < 3:
     raise NotImplementedError('missingdata package is only tested and supported for '
                               'Python 3 or higher. We encourage upgrading!')
 
-from missingdata.base import blackholes
+from missingdata.base import blackholes, comissing
+from missingdata.mask import MissingnessMask, PackedMissingnessMask
+from missingdata.readers import read_csv_mask
+from missingdata.ordering import cluster_order, pattern_order, spectral_order
+from missingdata.pairwise import nullity_correlation
+from missingdata.patterns import missingness_patterns
+from missingdata.stats import em_mvn, little_mcar_test, mar_screen
+from missingdata.gaps import gap_length_histogram, missing_runs
+from missingdata.imputation import (HotDeckImputer, IterativeImputer, KNNImputer,
+                                    MultipleImputations, OrderedImputer,
+                                    RegressionImputer, SimpleImputer, SoftImputer,
+                                    rubins_rules)
@@ -19,6 +19,10 @@ from matplotlib import colors
 from os.path import realpath
 
 from missingdata import config as cfg
+from missingdata.mask import MissingnessMask, PackedMissingnessMask, block_mean
+from missingdata.ordering import order_by
+from missingdata.pairwise import co_missing_blocked, co_missing_counts, \
+    co_missing_nearest
 from missingdata.utils import set_labels, remove_ticks_labels, \
     check_freq_thresh_labels
 
@@ -30,11 +34,15 @@ def blackholes(data_in,
                label_cols_with=None,
                group_rows_by=None,
                group_cols_by=None,
+               order_rows_by=None,
+               order_cols_by=None,
                missing_color='black',
                backkground_color='silver',
                freq_thresh_show_labels=0.0,
                show_all_labels=False,
                group_wise_colorbar=False,
+               packed_mask=False,
+               downsample=None,
                figsize=(15, 10),
                out_path=None,
                show_fig=False
@@ -54,10 +62,11 @@ def blackholes(data_in,
     Parameters
     ----------
 
-    data_in : pandas DataFrame
-        of shape: (num_rows, num_col)
+    data_in : pandas DataFrame or MissingnessMask
+        of shape: (num_rows, num_col). The missingness mask is computed only once
+        from the input, so it can also be passed in directly, if it already exists.
 
-    filter_spec_samples : (float, float) or callable
+    filter_spec_samples : (float, float) or callable or (str, value)
         Mechanism to discard samples or variables with missing values below this
         threshold. This must be a tuple of two values in the closed interval [0,1].
         Default: do not show complete samples or variables (those with no missing data).
@@ -65,12 +74,23 @@ def blackholes(data_in,
         legends and other labels are not too crowded or occluded altogether.
         To focus on those with frequently missing data (e.g. top 30%), choose (0.7, 1)
         To focus on those rarely missing (bottom 10%), choose (0.0, 0.1)
-        To focus on both frequent/rare cases, pass in a callable that takes a float value
-        as input (between 0 and 1) and returns a bool value to include or not e.g.
-
-        def to_include(perc): return (perc<0.1) or (perc>0.9)
-
-    filter_spec_variables : (float, float) or callable
+        To focus on both frequent/rare cases, pass in an array-aware callable that
+        takes the vector of frequencies as input (floats between 0 and 1) and returns
+        a bool array of the same shape indicating which ones to include e.g.
+
+        def to_include(perc): return (perc<0.1) | (perc>0.9)
+
+        This is evaluated with a single call over all rows (or cols). A callable
+        taking one float value at a time, and returning a single bool value, is also
+        accepted e.g. ``def to_include(perc): return (perc<0.1) or (perc>0.9)``, but
+        it will be much slower with a large number of samples or variables.
+        To select a fixed number of the most (or least) frequently missing, pass
+        ('top', k) or ('bottom', k) e.g. ('top', 200) for the 200 most-missing.
+        To select those within a window of quantiles of the frequency of
+        missingness, pass ('quantile', (low, high)) e.g. ('quantile', (0.9, 1.0))
+        These are computed via partial selection, without a full sort.
+
+    filter_spec_variables : (float, float) or callable or (str, value)
         same as filter_spec_samples (which is for rows), except for variables (columns)
 
     label_rows_with : str or int or list of len num_rows
@@ -87,6 +107,23 @@ def blackholes(data_in,
     group_cols_by : iterable, of length num_cols
         List of strings or numbers denoting their membership/category
 
+    order_rows_by : str or None
+        Alternative to group_rows_by, to place samples with similar missingness
+        next to each other. 'cluster' orders the rows by hierarchical clustering of
+        their nullity correlation, needing (num_rows x num_rows) memory.
+        For a large number of rows, choose one of the approximate orderings, in
+        near-linear time: 'pattern' sorts rows by the number of variables missing,
+        and then by their pattern of missingness, and 'spectral' sorts them along
+        the leading eigenvector of the missingness covariance, estimated from a
+        random sample of rows.
+        Default: None, keeping the original order of rows.
+
+    order_cols_by : str or None
+        Alternative to group_cols_by, to place variables with similar missingness
+        (frequently missing together) next to each other. 'cluster' orders them by
+        hierarchical clustering of their nullity correlation.
+        Default: None, keeping the original order of columns.
+
     missing_color : str or RGB
         Color name must be one from either
         https://matplotlib.org/examples/color/named_colors.html or
@@ -123,6 +160,21 @@ def blackholes(data_in,
         to indicate the groups rows or columns belong to
         Default: False
 
+    packed_mask : bool
+        Flag to store the missingness mask bit-packed (eight cells per byte),
+        reducing its memory footprint by a factor of 8 for very large inputs.
+        Default: False
+
+    downsample : str or None
+        Rendering mode for matrices larger than the resolution of the figure. When
+        not None, rows and columns of the frame are binned into blocks, each about
+        the size of a pixel in the exported figure (at 300dpi), before plotting.
+        Choose 'fraction' to shade each block by the fraction of its cells missing,
+        or 'any' to show a block as missing if any one of its cells is missing.
+        This bounds the rendering time and memory by the output resolution,
+        and avoids holes being dropped by the resampling in matplotlib.
+        Default: None, rendering all the cells as is.
+
     figsize : tuple
         Tuple of (width, height) to control the size of the plot.
         Default: (15, 10)
@@ -156,14 +208,27 @@ def blackholes(data_in,
 
     """
 
-    try:
-        data_in = pd.DataFrame(data_in)
-    except:
-        raise ValueError('Input must be convertible to a pandas dataframe!')
+    if isinstance(data_in, MissingnessMask):
+        mask, data_in = data_in, None
+        if packed_mask:
+            mask = mask.pack()
+        default_col_labels = 'col'
+    else:
+        try:
+            data_in = pd.DataFrame(data_in)
+        except:
+            raise ValueError('Input must be convertible to a pandas dataframe!')
+
+        if len(data_in.shape) != 2:
+            raise ValueError('Input data must be 2D matrix!')
+        # cell-wise boolean indicator of missingness: computed only once here
+        if packed_mask:
+            mask = PackedMissingnessMask.from_data(data_in)
+        else:
+            mask = MissingnessMask.from_data(data_in)
+        default_col_labels = data_in.columns
 
-    num_rows_orig, num_cols_orig = data_in.shape
-    if len(data_in.shape) != 2:
-        raise ValueError('Input data must be 2D matrix!')
+    num_rows_orig, num_cols_orig = mask.shape
 
     label_filter = check_freq_thresh_labels(freq_thresh_show_labels)
 
@@ -171,28 +236,27 @@ def blackholes(data_in,
     row_labels = process_labels(data_in, label_rows_with, num_rows_orig,
                                 'row', 'row')
     col_labels = process_labels(data_in, label_cols_with, num_cols_orig,
-                                data_in.columns, 'col')
+                                default_col_labels, 'col')
 
     # adjusting defaults when dealing with very small samples
     # as even a small eps requirement for miss perc can exclude most samples
     filter_spec_samples = _set_default_filter_spec(filter_spec_samples,
-                                                   data_in.shape[0],
+                                                   num_rows_orig,
                                                    cfg.MAX_ROWS_DISPLAYABLE)
     filter_spec_variables = _set_default_filter_spec(filter_spec_variables,
-                                                   data_in.shape[1],
+                                                   num_cols_orig,
                                                    cfg.MAX_COLS_DISPLAYABLE)
 
-    # filtering data
-    data, row_filter, col_filter = freq_filter(data_in,
-                                               filter_spec_samples,
-                                               filter_spec_variables)
+    # filtering data: only indices into the mask, no copies of data
+    mask, row_idx, col_idx = freq_filter(mask,
+                                         filter_spec_samples,
+                                         filter_spec_variables)
     # accordingly filterning labels
-    row_labels = row_labels[row_filter]
-    col_labels = col_labels[col_filter]
+    row_labels = row_labels[row_idx]
+    col_labels = col_labels[col_idx]
 
     # new size
-    num_rows, num_cols = data.shape
-    cell_flag = data.isnull().values
+    num_rows, num_cols = len(row_idx), len(col_idx)
 
 
     # --- grouping
@@ -201,11 +265,11 @@ def blackholes(data_in,
         if len(group_rows_by) != num_rows_orig:
             raise ValueError('Grouping variable for samples/rows must have {} elements'
                              ''.format(num_rows_orig))
-        group_rows_by = group_rows_by[row_filter]
+        group_rows_by = group_rows_by[row_idx]
         row_group_set, row_group_index = np.unique(group_rows_by, return_inverse=True)
 
         row_sort_idx = np.argsort(group_rows_by)
-        cell_flag, row_labels = reorder_rows(cell_flag, row_labels, row_sort_idx)
+        row_idx, row_labels = row_idx[row_sort_idx], row_labels[row_sort_idx]
         group_rows_sorted = group_rows_by[row_sort_idx]
         row_group_index_sorted = row_group_index[row_sort_idx]
 
@@ -219,11 +283,11 @@ def blackholes(data_in,
         if len(group_cols_by) != num_cols_orig:
             raise ValueError('Grouping variable for variables/cols must have {} elements'
                              ''.format(num_cols_orig))
-        group_cols_by = group_cols_by[col_filter]
+        group_cols_by = group_cols_by[col_idx]
         col_group_set, col_group_index = np.unique(group_cols_by, return_inverse=True)
 
         col_sort_idx = np.argsort(group_cols_by)
-        cell_flag, col_labels = reorder_cols(cell_flag, col_labels, col_sort_idx)
+        col_idx, col_labels = col_idx[col_sort_idx], col_labels[col_sort_idx]
         group_cols_sorted = group_cols_by[col_sort_idx]
         col_group_index_sorted = col_group_index[col_sort_idx]
 
@@ -232,17 +296,32 @@ def blackholes(data_in,
     else:
         show_col_groups = False
 
+    # --- ordering by similarity in missingness, as an alternative to grouping
+    if order_rows_by is not None:
+        if show_row_groups:
+            raise ValueError('order_rows_by is an alternative to group_rows_by: '
+                             'specify only one of them.')
+        row_order = order_by(mask, row_idx, col_idx, 'subjects', order_rows_by)
+        row_idx, row_labels = row_idx[row_order], row_labels[row_order]
+
+    if order_cols_by is not None:
+        if show_col_groups:
+            raise ValueError('order_cols_by is an alternative to group_cols_by: '
+                             'specify only one of them.')
+        col_order = order_by(mask, row_idx, col_idx, 'variables', order_cols_by)
+        col_idx, col_labels = col_idx[col_order], col_labels[col_order]
+
 
     # ---
     missing_color = colors.to_rgb(missing_color)  # no alpha
     backkground_color = colors.to_rgb(backkground_color)
 
-    frame = np.zeros((num_rows, num_cols, 3), dtype='float64')
-    frame[ cell_flag, :] = missing_color
-    frame[~cell_flag, :] = backkground_color
+    if downsample not in (None, 'fraction', 'any'):
+        raise ValueError("downsample must be one of None, 'fraction' or 'any'")
 
-    row_wise_freq = cell_flag.sum(axis=1).reshape(-1, 1)  # ensuring its atleast 2D
-    col_wise_freq = cell_flag.sum(axis=0).reshape(1, -1)
+    row_wise_freq, col_wise_freq = mask.counts(row_idx, col_idx)
+    row_wise_freq = row_wise_freq.reshape(-1, 1)  # ensuring its atleast 2D
+    col_wise_freq = col_wise_freq.reshape(1, -1)
 
     # normalizing frequency
     row_wise_freq = row_wise_freq / row_wise_freq.sum()
@@ -287,7 +366,24 @@ def blackholes(data_in,
 
     # ---
     ax_frame = fig.add_axes(ext_frame, frameon=False)
-    ax_frame.imshow(frame)
+    if downsample is None:
+        # one byte per cell (0: present, 1: missing), painted via a two-color colormap
+        frame = mask.to_image(row_idx, col_idx)
+        frame_cmap = colors.ListedColormap([backkground_color, missing_color])
+    else:
+        # blocks of cells, each about a pixel in size
+        frame_pixels = (int(np.ceil(figsize[1] * height * cfg.EXPORT_DPI)),
+                        int(np.ceil(figsize[0] * width * cfg.EXPORT_DPI)))
+        frame = mask.block_reduce(row_idx, col_idx, frame_pixels, downsample)
+        if downsample == 'fraction':
+            frame_cmap = colors.LinearSegmentedColormap.from_list(
+                'missing_fraction', [backkground_color, missing_color])
+        else:
+            frame_cmap = colors.ListedColormap([backkground_color, missing_color])
+
+    # extent in units of cells, so the frequency bars (and labels) stay aligned
+    ax_frame.imshow(frame, cmap=frame_cmap, vmin=0, vmax=1, interpolation='nearest',
+                    extent=(-0.5, num_cols - 0.5, num_rows - 0.5, -0.5))
     ax_frame.axis('off') # remove axes, ticks etc
     ax_frame.set_aspect('auto')
 
@@ -383,7 +479,7 @@ def blackholes(data_in,
         plt.show(block=False)
 
     if out_path is not None:
-        fig.savefig(realpath(out_path), dpi=300, format='pdf')
+        fig.savefig(realpath(out_path), dpi=cfg.EXPORT_DPI, format='pdf')
 
     return fig, ax_frame, \
            ax_freq_over_row, ax_freq_over_col, \
@@ -393,6 +489,12 @@ def blackholes(data_in,
 def comissing(data_in,
               filter_spec_samples=(np.finfo(np.float32).eps, 1.0),
               filter_spec_variables=(np.finfo(np.float32).eps, 1.0),
+              axis='variables',
+              method='matmul',
+              out_file=None,
+              num_nearest=None,
+              label_with=None,
+              show_all_labels=False,
               cmap='viridis',
               figsize=(15, 10),
               out_path=None,
@@ -401,17 +503,172 @@ def comissing(data_in,
     """
     Pairwise relations in missingness (co-missing) between variables/subjects.
 
+    Parameters
+    ----------
+
+    data_in : pandas DataFrame or MissingnessMask
+        of shape: (num_rows, num_col)
+
+    filter_spec_samples : (float, float) or callable or (str, value)
+        Specification of samples to include, as in ``blackholes``.
+        Default: samples with at least one value missing.
+
+    filter_spec_variables : (float, float) or callable or (str, value)
+        Specification of variables to include, as in ``blackholes``.
+        Default: variables with at least one value missing.
+
+    axis : str
+        'variables' to show the number of samples in which each pair of variables
+        is missing together, or 'subjects' to show the number of variables
+        missing together for each pair of samples.
+        Default: 'variables'
+
+    method : str
+        'matmul' to compute the co-missing counts with a single matrix product of the
+        mask, or 'popcount' to count the bits in common between bit-packed
+        variables (or samples).
+        Default: 'matmul'
+
+    out_file : str or None
+        Path to a .npy file, to compute the subject-by-subject co-missing counts in
+        tiles of rows and write them to this memory-mapped file on disk, instead of
+        holding them in memory. Only for axis='subjects'. The plot is rendered
+        from the file, downsampled a block of rows at a time.
+        Default: None
+
+    num_nearest : int or None
+        When specified, only the num_nearest most similar subjects (in Jaccard
+        similarity of their missingness) are found for each subject, computed in
+        tiles with bounded memory. Their similarities are shown in decreasing order
+        for each subject. Only for axis='subjects'.
+        Default: None
+
+    label_with : str or int or list
+        Name of the variable in panda DataFrame to label subjects with, or a list
+        of labels for all the variables (or subjects), before filtering.
+        Default: column names for variables, and row indices for subjects.
+
+    show_all_labels : bool
+        Flag to force the display of all the labels, even if their number is large.
+        Default: False
+
+    cmap : str
+        Name of the colormap for the co-missing counts.
+        Default: 'viridis'
+
+    figsize : tuple
+        Tuple of (width, height) to control the size of the plot.
+        Default: (15, 10)
+
+    out_path : str
+        Absolute path to export the figure to disk (PDF format, 300dpi).
+
+    show_fig : bool
+        Flag to indicate whether to bring the figure to foreground
+        Default: False
+
+    Returns
+    -------
+    fig : matplotlib.Figure
+        Handle to the figure created
+
+    ax : matplotlib.Axis
+        Handle to the co-missing matrix in the visualization
+
+    co_missing : ndarray of int or numpy.memmap or (ndarray, ndarray)
+        Symmetric matrix of co-missing counts, with the number of missing values in
+        each variable (or subject) on the diagonal, memory-mapped if out_file was
+        specified. With num_nearest, a tuple of the positions of the nearest
+        subjects (among those displayed) and their similarities, each of shape
+        (num_subjects, num_nearest).
+
     """
 
-    raise NotImplementedError()
+    if axis not in ('variables', 'subjects'):
+        raise ValueError("axis must be either 'variables' or 'subjects'")
+
+    if (out_file is not None or num_nearest is not None) and axis != 'subjects':
+        raise ValueError("out_file and num_nearest are only for axis='subjects'")
+
+    if isinstance(data_in, MissingnessMask):
+        mask, data_in = data_in, None
+        default_col_labels = 'col'
+    else:
+        try:
+            data_in = pd.DataFrame(data_in)
+        except:
+            raise ValueError('Input must be convertible to a pandas dataframe!')
+        mask = MissingnessMask.from_data(data_in)
+        default_col_labels = data_in.columns
+
+    mask, row_idx, col_idx = freq_filter(mask,
+                                         filter_spec_samples,
+                                         filter_spec_variables)
+
+    if axis == 'variables':
+        labels = process_labels(data_in, label_with, mask.num_cols,
+                                default_col_labels, 'col')[col_idx]
+        max_displayable = cfg.MAX_COLS_DISPLAYABLE
+    else:
+        labels = process_labels(data_in, label_with, mask.num_rows,
+                                'row', 'row')[row_idx]
+        max_displayable = cfg.MAX_ROWS_DISPLAYABLE
+
+    num_items = len(labels)
+    x_labels = labels
+    if num_nearest is not None:
+        co_missing = co_missing_nearest(mask, num_nearest, row_idx, col_idx)
+        to_render = co_missing[1]
+        x_labels = np.array([str(rank) for rank in range(1, to_render.shape[1]+1)])
+    elif out_file is not None:
+        co_missing = co_missing_blocked(mask, out_file, row_idx, col_idx)
+        to_render = co_missing
+    else:
+        co_missing = co_missing_counts(mask, row_idx, col_idx,
+                                       axis=axis, method=method)
+        to_render = co_missing
+
+    # rendering at most a block of cells per pixel, reading a block of rows at a time
+    max_pixels = [int(np.ceil(size * cfg.EXPORT_DPI)) for size in figsize[::-1]]
+    num_rendered_rows, num_rendered_cols = to_render.shape
+    image = block_mean(to_render, max_pixels)
+
+    fig, ax = plt.subplots(figsize=figsize)
+    ax_image = ax.imshow(image, cmap=cmap, interpolation='nearest',
+                         extent=(-0.5, num_rendered_cols - 0.5,
+                                 num_rendered_rows - 0.5, -0.5))
+    ax.set_aspect('auto')
+    fig.colorbar(ax_image, ax=ax)
+    if show_all_labels or num_items <= max_displayable:
+        set_labels(ax, 'x', range(len(x_labels)), x_labels, rotation=90)
+        set_labels(ax, 'y', range(num_items), labels)
+    else:
+        remove_ticks_labels(ax, 'x')
+        remove_ticks_labels(ax, 'y')
+
+    if show_fig:
+        plt.show(block=False)
+
+    if out_path is not None:
+        fig.savefig(realpath(out_path), dpi=cfg.EXPORT_DPI, format='pdf')
+
+    return fig, ax, co_missing
 
 
 def reorder_rows(cell_flag, row_labels, row_group_index):
+    """Reorders the rows of a boolean indicator array, or of a (packed) mask."""
+
+    if isinstance(cell_flag, MissingnessMask):
+        return cell_flag.take(row_idx=row_group_index), row_labels[row_group_index]
 
     return cell_flag[row_group_index,:], row_labels[row_group_index]
 
 
 def reorder_cols(cell_flag, col_labels, col_group_index):
+    """Reorders the columns of a boolean indicator array, or of a (packed) mask."""
+
+    if isinstance(cell_flag, MissingnessMask):
+        return cell_flag.take(col_idx=col_group_index), col_labels[col_group_index]
 
     return cell_flag[:, col_group_index], col_labels[col_group_index]
 
@@ -465,21 +722,36 @@ def decorate_col_groups_with_total_freq(ax, group_idx, freq, group_names):
 
 
 def freq_filter(data, row_spec, col_spec):
-    """Removes samples and variables according to their missing data frequency"""
+    """Selects samples and variables according to their missing data frequency.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or MissingnessMask
+        Input data, or its missingness mask if it has already been computed.
+
+    row_spec, col_spec : (float, float) or callable or (str, value)
+        Filter specifications for rows and columns, as in ``blackholes``.
+
+    Returns
+    -------
+    mask : MissingnessMask
+        Missingness mask of the input data (the same object, if a mask was passed in)
+
+    row_idx, col_idx : ndarray of int
+        Indices of the samples and variables that pass the filters.
+
+    """
 
     row_filter = _validate_filter_spec(row_spec)
     col_filter = _validate_filter_spec(col_spec)
 
     # cell-wise boolean indicator of whether data is missing in that cell or not
-    cell_flag = data.isnull().values
+    mask = MissingnessMask.from_data(data)
 
-    row_freq = cell_flag.sum(axis=1).ravel()
-    col_freq = cell_flag.sum(axis=0).ravel()
+    filtered_rows = row_filter(mask.row_freq)
+    filtered_cols = col_filter(mask.col_freq)
 
-    filtered_rows = np.fromiter(map(row_filter, row_freq / row_freq.size), dtype=bool)
-    filtered_cols = np.fromiter(map(col_filter, col_freq / col_freq.size), dtype=bool)
-
-    return data.iloc[filtered_rows, filtered_cols], filtered_rows, filtered_cols
+    return mask, np.flatnonzero(filtered_rows), np.flatnonzero(filtered_cols)
 
 
 def _set_default_filter_spec(spec, size, max_size):
@@ -494,9 +766,12 @@ def _set_default_filter_spec(spec, size, max_size):
 
 
 def _validate_filter_spec(spec):
-    """Validates input and returns a func"""
+    """Validates input and returns a func mapping a vector of frequencies to a bool mask"""
+
+    if isinstance(spec, (tuple, list)) and len(spec) > 0 and isinstance(spec[0], str):
+        filter_func = _selection_filter(spec)
 
-    if isinstance(spec, (tuple, list)):
+    elif isinstance(spec, (tuple, list)):
         error_msg_window = 'Filter perc must be specified as a tuple of two values: ' \
                            '(low, high), each value must be between 0 and 1.'
 
@@ -508,26 +783,130 @@ def _validate_filter_spec(spec):
             raise ValueError(error_msg_window)
 
         low_perc, high_perc = spec
-        filter_func = lambda perc: (perc >= low_perc) and (perc <= high_perc)
+
+        def filter_func(perc):
+            return (perc >= low_perc) & (perc <= high_perc)
 
     elif callable(spec):
-        if not isinstance(spec(0.5), bool):
-            raise ValueError('When filter spec is callable, its return value must be '
-                             ' of type bool!')
-        filter_func = spec
+        if _is_array_aware(spec):
+            filter_func = _array_filter(spec)
+        else:
+            if not isinstance(spec(0.5), (bool, np.bool_)):
+                raise ValueError('When filter spec is callable, its return value must be '
+                                 ' of type bool!')
+            # fallback for callables accepting only a single value at a time
+            def filter_func(perc):
+                return np.fromiter(map(spec, perc), dtype=bool, count=len(perc))
     else:
         raise TypeError('filter spec can only be a tuple or callable!')
 
     return filter_func
 
 
+def _selection_filter(spec):
+    """Returns a func selecting the top/bottom k, or a quantile window, of frequencies.
+
+    These rely on partial selection (np.argpartition and np.partition), which is
+    linear in the number of elements, instead of a full sort.
+    """
+
+    error_msg_mode = "Selection filter spec must be one of ('top', k), " \
+                     "('bottom', k) or ('quantile', (low, high))"
+    if len(spec) != 2:
+        raise ValueError(error_msg_mode)
+
+    mode, value = spec
+    mode = mode.lower()
+    if mode in ('top', 'bottom'):
+        if not isinstance(value, (int, np.integer)) or value < 0:
+            raise ValueError('Number of elements to select must be an int >= 0')
+        num_select = int(value)
+
+        def filter_func(perc):
+            return _top_k_mask(perc, num_select, largest=(mode == 'top'))
+
+    elif mode == 'quantile':
+        quantiles = np.array(value, dtype='float64')
+        if quantiles.shape != (2,) or (quantiles < 0.0).any() or \
+                (quantiles > 1.0).any() or quantiles[0] > quantiles[1]:
+            raise ValueError('Quantile window must be a tuple of two values: '
+                             '(low, high), with 0 <= low <= high <= 1.')
+
+        def filter_func(perc):
+            low_perc, high_perc = _partial_quantiles(perc, quantiles)
+            return (perc >= low_perc) & (perc <= high_perc)
+
+    else:
+        raise ValueError(error_msg_mode)
+
+    return filter_func
+
+
+def _top_k_mask(values, num_select, largest=True):
+    """Boolean mask selecting the k largest (or smallest) values, without sorting."""
+
+    selected = np.zeros(len(values), dtype=bool)
+    if num_select >= len(values):
+        selected[:] = True
+    elif num_select > 0:
+        if largest:
+            split = len(values) - num_select
+            selected[np.argpartition(values, split)[split:]] = True
+        else:
+            selected[np.argpartition(values, num_select - 1)[:num_select]] = True
+
+    return selected
+
+
+def _partial_quantiles(values, quantiles):
+    """Quantiles (with linear interpolation, as in np.quantile) via partial selection."""
+
+    if len(values) < 1:
+        return np.full(len(quantiles), np.nan)
+
+    position = np.asarray(quantiles) * (len(values) - 1)
+    below = np.floor(position).astype('intp')
+    above = np.ceil(position).astype('intp')
+    partitioned = np.partition(values, np.unique(np.r_[below, above]))
+    weight = position - below
+
+    return (1 - weight) * partitioned[below] + weight * partitioned[above]
+
+
+def _is_array_aware(func):
+    """Checks whether the callable maps an array of frequencies to a bool mask."""
+
+    probe = np.array([0.0, 0.5, 1.0])
+    try:
+        result = func(probe)
+    except (TypeError, ValueError):
+        # e.g. using an array in a scalar boolean context
+        return False
+
+    return isinstance(result, np.ndarray) and result.dtype == bool \
+           and result.shape == probe.shape
+
+
+def _array_filter(func):
+    """Wraps an array-aware callable, to check the output of each call."""
+
+    def filter_func(perc):
+        selected = np.asarray(func(perc))
+        if selected.dtype != bool or selected.shape != perc.shape:
+            raise ValueError('Array-aware filter spec must return a bool array of the '
+                             'same shape as its input!')
+        return selected
+
+    return filter_func
+
+
 def process_labels(data, labels, length, default_prefix='row', type_='row'):
     """Returns the labels for samples/variables."""
 
     strip_all = lambda arr : [lbl.strip() for lbl in arr]
 
     if labels is not None:
-        if labels in data:
+        if data is not None and np.isscalar(labels) and labels in data:
             out_labels = data[labels]
         elif len(labels) == length:
             out_labels = labels
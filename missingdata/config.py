@@ -8,3 +8,14 @@ cmap_grouping = 'copper' # 'Greys'
 grouping_text_color = 'white'
 grouping_text_color_background = 'grey'
 grouping_fontweight = 'bold'
+
+# memory budget (in bytes) for the blocks of rows processed at a time
+CHUNK_SIZE_BYTES = 2**26
+
+# resolution of the exported figures
+EXPORT_DPI = 300
+
+# tokens (besides empty fields) indicating missing data, as in pandas.read_csv
+NA_TOKENS = ('#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+             '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+             'n/a', 'nan', 'null')
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""
+Gaps (stretches of consecutive missing values) in ordered data, such as time
+series from sensors or process data.
+
+"""
+
+import numpy as np
+
+from missingdata.mask import MissingnessMask, _check_index, _rows_per_block
+
+
+def missing_runs(data, col_idx=None):
+    """Run-length encoding of the gaps (consecutive missing values) in each column.
+
+    Rows are assumed to be in their natural (e.g. temporal) order. All the runs in
+    a block of columns are found in one vectorized pass: the indicators of each
+    column are padded with a present value at either end and laid out one after
+    another, so the runs begin (end) where the difference of consecutive cells is
+    +1 (-1), and are located with np.flatnonzero.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray or MissingnessMask
+        of shape (num_rows, num_cols), with rows in order (e.g. of time)
+
+    col_idx : ndarray of int or None
+        Columns to analyze. Default: all of them.
+
+    Returns
+    -------
+    starts : ndarray of int64
+        Row of the first missing value in each gap. With a DataFrame, its timing is
+        ``data.index[starts]``
+
+    lengths : ndarray of int64
+        Number of consecutive missing values in each gap
+
+    cols : ndarray of int64
+        Column (position within col_idx, if given) of each gap.
+        Gaps are sorted by column, and then by their start.
+
+    """
+
+    mask = MissingnessMask.from_data(data)
+    col_idx = _check_index(col_idx, mask.num_cols)
+    if col_idx is None:
+        col_idx = np.arange(mask.num_cols)
+    num_rows = mask.num_rows
+    padded_len = num_rows + 2
+
+    # columns are processed in blocks, within the memory budget
+    block_size = _rows_per_block(padded_len, bytes_per_cell=2)
+    starts, lengths, cols = list(), list(), list()
+    for first_col in range(0, len(col_idx), block_size):
+        block_cols = col_idx[first_col:first_col + block_size]
+        padded = np.zeros((len(block_cols), padded_len), dtype='int8')
+        padded[:, 1:-1] = mask.to_array(None, block_cols).T
+        steps = np.diff(padded.ravel())
+
+        # step at k is between cells k and k+1 of the padded layout
+        run_starts = np.flatnonzero(steps == 1)
+        run_ends = np.flatnonzero(steps == -1)
+        run_cols = run_starts // padded_len
+        starts.append(run_starts - run_cols * padded_len)
+        lengths.append(run_ends - run_starts)
+        cols.append(run_cols + first_col)
+
+    if len(starts) < 1:
+        empty = np.zeros(0, dtype='int64')
+        return empty, empty.copy(), empty.copy()
+
+    return np.concatenate(starts).astype('int64'), \
+           np.concatenate(lengths).astype('int64'), \
+           np.concatenate(cols).astype('int64')
+
+
+def gap_length_histogram(lengths, cols=None, num_cols=None, bins=None):
+    """Histograms of gap lengths, overall or for each column.
+
+    Parameters
+    ----------
+    lengths : ndarray of int
+        Lengths of the gaps, as from ``missing_runs``
+
+    cols : ndarray of int or None
+        Column of each gap, to compute a histogram for each column.
+        Default: None, a single histogram over all the gaps.
+
+    num_cols : int or None
+        Number of columns. Default: the largest column in cols, plus one.
+
+    bins : ndarray of int or None
+        Increasing edges of the bins of lengths, each bin including its left edge
+        (and the last one its right edge too). Lengths outside are not counted.
+        Default: powers of two, i.e. lengths 1, 2-3, 4-7, 8-15 and so on.
+
+    Returns
+    -------
+    counts : ndarray of int64
+        Number of gaps in each bin, of shape (num_bins, ), or (num_cols, num_bins)
+        when cols are given
+
+    bins : ndarray of int
+        Edges of the bins, of length num_bins+1
+
+    """
+
+    lengths = np.asarray(lengths, dtype='int64')
+    if bins is None:
+        max_length = lengths.max() if lengths.size > 0 else 1
+        num_bits = int(np.floor(np.log2(max(max_length, 1)))) + 1
+        bins = 2 ** np.arange(num_bits + 1)
+    bins = np.asarray(bins)
+    if bins.ndim != 1 or len(bins) < 2 or (np.diff(bins) <= 0).any():
+        raise ValueError('bins must be an increasing sequence of at least 2 edges!')
+
+    num_bins = len(bins) - 1
+    bin_idx = np.searchsorted(bins, lengths, side='right') - 1
+    # the last bin includes its right edge too, as in np.histogram
+    in_range = (lengths >= bins[0]) & (lengths <= bins[-1])
+    bin_idx = np.minimum(bin_idx, num_bins - 1)[in_range]
+
+    if cols is None:
+        return np.bincount(bin_idx, minlength=num_bins).astype('int64'), bins
+
+    cols = np.asarray(cols, dtype='int64')[in_range]
+    if num_cols is None:
+        num_cols = int(cols.max()) + 1 if cols.size > 0 else 0
+    counts = np.bincount(cols * num_bins + bin_idx, minlength=num_cols * num_bins)
+
+    return counts.reshape(num_cols, num_bins).astype('int64'), bins
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+"""Imputation of missing values, with fit/transform semantics."""
+
+from missingdata.imputation.simple import SimpleImputer
+from missingdata.imputation.regression import RegressionImputer
+from missingdata.imputation.knn import KNNImputer
+from missingdata.imputation.iterative import IterativeImputer
+from missingdata.imputation.matrix_completion import SoftImputer
+from missingdata.imputation.ordered import OrderedImputer
+from missingdata.imputation.multiple import MultipleImputations, rubins_rules
+from missingdata.imputation.hotdeck import HotDeckImputer
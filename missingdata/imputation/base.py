@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""
+Common mechanics of the imputers: validating the input, and filling the missing
+cells through the missingness mask.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from missingdata.mask import MissingnessMask, _rows_per_block
+
+
+class BaseImputer(object):
+    """Base class for imputers, with fit/transform semantics.
+
+    Subclasses implement ``fit``, estimating what they need from the data, and
+    ``_impute``, filling in the missing cells of a float array in place.
+    """
+
+    def fit(self, data):
+        raise NotImplementedError()
+
+
+    def transform(self, data):
+        """Imputes the missing values in data, as estimated during fit.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or ndarray
+            of shape (num_rows, num_cols), with NaNs where missing
+
+        Returns
+        -------
+        imputed : pandas DataFrame or ndarray
+            of the same type and shape as data, with the missing values filled in.
+            With copy=False and a float ndarray as input, the data itself is filled
+            in place and returned.
+
+        """
+
+        self._check_fitted()
+        values = _check_values(data, copy=self.copy)
+        if values.shape[1] != self.num_cols_:
+            raise ValueError('Data must have {} columns, as during fit!'
+                             ''.format(self.num_cols_))
+
+        self._impute(values, np.isnan(values))
+
+        return _wrap_like(values, data)
+
+
+    def fit_transform(self, data):
+        """Fits the imputer to data, and then imputes its missing values."""
+
+        return self.fit(data).transform(data)
+
+
+    def _impute(self, values, cell_flag):
+        raise NotImplementedError()
+
+
+    def _check_fitted(self):
+
+        if not hasattr(self, 'num_cols_'):
+            raise ValueError('{} must be fit before imputing!'
+                             ''.format(self.__class__.__name__))
+
+
+def _check_values(data, copy=True):
+    """Values of the data as a floating point array, with NaNs where missing.
+
+    float32 and float64 values are kept as such, everything else becomes float64.
+    Unless copy is True, float arrays are returned as is, to be filled in place.
+    Read-only values (e.g. views of DataFrames with copy-on-write) are copied, so
+    DataFrames are only filled in place when pandas gives a writeable view.
+    """
+
+    if isinstance(data, MissingnessMask):
+        raise TypeError('Values of the data are needed, not just its missingness!')
+
+    if isinstance(data, pd.DataFrame):
+        dtypes = set(data.dtypes)
+        dtype = 'float32' if dtypes == {np.dtype('float32')} else 'float64'
+        try:
+            values = data.to_numpy(dtype=dtype, na_value=np.nan, copy=copy)
+        except (TypeError, ValueError):
+            raise ValueError('Data must be numeric (convertible to float)!')
+    else:
+        values = np.asarray(data)
+        if values.dtype not in (np.float32, np.float64):
+            try:
+                values = values.astype('float64')
+            except (TypeError, ValueError):
+                raise ValueError('Data must be numeric (convertible to float)!')
+        elif copy:
+            values = values.copy()
+
+    if values.ndim != 2:
+        raise ValueError('Input data must be 2D matrix!')
+
+    if not values.flags.writeable:
+        values = values.copy()
+
+    return values
+
+
+def _wrap_like(values, data):
+    """Returns the values in the same type of container as the input data."""
+
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(values, index=data.index, columns=data.columns, copy=False)
+
+    return values
+
+
+def _fill(values, cell_flag, fill_values):
+    """Fills the missing cells with the value for their column, in one assignment."""
+
+    rows, cols = np.nonzero(cell_flag)
+    values[rows, cols] = fill_values[cols]
+
+    return values
+
+
+class _RunningMoments(object):
+    """NaN-aware running counts and means (and comoments), updated per batch.
+
+    The moments of a batch are computed in one vectorized pass over each block of
+    its rows (within the memory budget), and merged into the running ones with the
+    pairwise form of Welford's update (Chan et al.), so that earlier batches are
+    never needed again.
+
+    With pairwise=True, moments are kept for every pair of variables (i, j), over the
+    rows where both are observed: mean[i, j] is the mean of variable i over those
+    rows, and comoment[i, j] the sum of products of the deviations of i and j, from
+    matrix products of the zero-filled values and the observed indicators.
+    Otherwise, only the count and mean of each variable are kept.
+    """
+
+    def __init__(self, num_cols, pairwise=False, count=None, mean=None):
+
+        shape = (num_cols, num_cols) if pairwise else (num_cols, )
+        self.pairwise = pairwise
+        self.num_cols = num_cols
+        self.count = np.zeros(shape) if count is None else np.asarray(count, 'float64')
+        self.mean = np.zeros(shape) if mean is None else \
+            np.where(self.count > 0, mean, 0.0)
+        self.comoment = np.zeros(shape) if pairwise else None
+
+
+    def update(self, values):
+        """Merges the moments of a batch of rows into the running moments."""
+
+        # (num_cols) float64 temporaries of the values and indicators per cell
+        block_size = _rows_per_block(self.num_cols, bytes_per_cell=32)
+        for start in range(0, values.shape[0], block_size):
+            self._merge(*self._block_moments(values[start:start + block_size]))
+
+        return self
+
+
+    def _block_moments(self, values):
+        """Counts, means and comoments of a block of rows."""
+
+        observed = ~np.isnan(values)
+        # shifting by the block means improves the precision of the products
+        shift = np.zeros(self.num_cols)
+        has_obs = observed.any(axis=0)
+        shift[has_obs] = np.nanmean(values[:, has_obs], axis=0, dtype='float64')
+        centered = np.where(observed, values - shift, 0.0)
+
+        if self.pairwise:
+            indicators = observed.astype('float64')
+            count = indicators.T @ indicators
+            sums = centered.T @ indicators
+        else:
+            count = observed.sum(axis=0).astype('float64')
+            sums = centered.sum(axis=0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, sums / count, 0.0)
+        comoment = centered.T @ centered - count * mean * mean.T \
+            if self.pairwise else None
+        mean += shift[:, np.newaxis] if self.pairwise else shift
+
+        return count, mean, comoment
+
+
+    def _merge(self, count, mean, comoment):
+        """Combines the running moments with those of another set of rows."""
+
+        total = self.count + count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frac = np.where(total > 0, count / total, 0.0)
+        delta = mean - self.mean
+
+        if self.pairwise:
+            self.comoment = self.comoment + comoment \
+                            + delta * delta.T * self.count * frac
+        self.mean = self.mean + delta * frac
+        self.count = total
+
+
+    @property
+    def means(self):
+        """Means of each variable over all its observed values (NaN if none)."""
+
+        count = np.diagonal(self.count) if self.pairwise else self.count
+        mean = np.diagonal(self.mean) if self.pairwise else self.mean
+
+        return np.where(count > 0, mean, np.nan)
+
+
+    @property
+    def covariance(self):
+        """Unbiased covariances, over pairwise observed values (NaN if too few)."""
+
+        if not self.pairwise:
+            raise ValueError('Covariances are only kept for pairs of variables!')
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1, self.comoment / (self.count - 1), np.nan)
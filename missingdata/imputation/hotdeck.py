@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+Hot-deck imputation, drawing values from donors in the same group (class) of rows.
+
+"""
+
+import numpy as np
+
+from missingdata.imputation.base import BaseImputer, _check_values, _wrap_like
+
+
+class HotDeckImputer(BaseImputer):
+    """Fills each missing value with that of a random donor from the same group.
+
+    Donors of a variable are the rows (seen during fit) with that variable observed.
+    Groups of rows (donor classes) are specified as in ``blackholes``, with
+    ``group_rows_by``. Rows are sorted by group once, so the donors of each variable
+    are an array of rows sorted by group, along with the offsets where each group
+    starts. All the missing values of a variable are then imputed with a single
+    vectorized random draw of a position within the donors of their group.
+
+    Groups without any donors for a variable (or groups not seen during fit) draw
+    from the donors of all the groups.
+
+    Parameters
+    ----------
+    seed : int or None
+        Seed for the random draws of donors. Default: 0
+
+    copy : bool
+        If False, float32/float64 arrays are imputed in place. Default: True
+
+    Attributes
+    ----------
+    group_set_ : ndarray
+        unique groups of rows, seen during fit
+
+    donor_rows_ : list of ndarray
+        for each variable, the rows with the variable observed, sorted by group
+
+    donor_offsets_ : ndarray
+        of shape (num_cols, num_groups + 1), where the donors of each group start
+        within donor_rows_ for each variable
+
+    """
+
+    def __init__(self, seed=0, copy=True):
+
+        self.seed = seed
+        self.copy = copy
+
+
+    def fit(self, data, group_rows_by=None):
+        """Builds the pools of donors for each variable and group of rows.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or ndarray
+            of shape (num_rows, num_cols), with NaNs where missing
+
+        group_rows_by : iterable, of length num_rows, or None
+            List of strings or numbers denoting their membership/category.
+            Default: None, all the rows in a single group
+
+        """
+
+        self.values_ = _check_values(data, copy=True)
+        num_rows, num_cols = self.values_.shape
+        if group_rows_by is None:
+            self.group_set_ = np.array([0])
+            group_index = np.zeros(num_rows, dtype='intp')
+        else:
+            group_rows_by = np.asarray(group_rows_by)
+            if len(group_rows_by) != num_rows:
+                raise ValueError('Grouping variable for samples/rows must have {} '
+                                 'elements'.format(num_rows))
+            self.group_set_, group_index = np.unique(group_rows_by, return_inverse=True)
+        num_groups = len(self.group_set_)
+
+        # sorting once by group; donors of every variable remain sorted by group
+        row_order = np.argsort(group_index, kind='stable')
+        observed = ~np.isnan(self.values_)[row_order]
+        self.donor_rows_ = list()
+        self.donor_offsets_ = np.zeros((num_cols, num_groups + 1), dtype='intp')
+        for col in range(num_cols):
+            donors = row_order[observed[:, col]]
+            self.donor_rows_.append(donors)
+            self.donor_offsets_[col, 1:] = np.cumsum(
+                np.bincount(group_index[donors], minlength=num_groups))
+        self.num_cols_ = num_cols
+
+        return self
+
+
+    def transform(self, data, group_rows_by=None):
+        """Imputes the missing values in data, from donors in the same group.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or ndarray
+            of shape (num_rows, num_cols), with NaNs where missing
+
+        group_rows_by : iterable, of length num_rows, or None
+            Groups of the rows in data, as during fit. Default: None, drawing from
+            the donors of all the groups
+
+        Returns
+        -------
+        imputed : pandas DataFrame or ndarray
+            of the same type and shape as data, with the missing values filled in
+
+        """
+
+        self._check_fitted()
+        values = _check_values(data, copy=self.copy)
+        if values.shape[1] != self.num_cols_:
+            raise ValueError('Data must have {} columns, as during fit!'
+                             ''.format(self.num_cols_))
+
+        self._draw(values, np.isnan(values), self._group_index(group_rows_by,
+                                                               values.shape[0]))
+
+        return _wrap_like(values, data)
+
+
+    def fit_transform(self, data, group_rows_by=None):
+        """Builds the donor pools from data, and then imputes its missing values."""
+
+        return self.fit(data, group_rows_by).transform(data, group_rows_by)
+
+
+    def _impute(self, values, cell_flag):
+
+        self._draw(values, cell_flag, None)
+
+
+    def _group_index(self, group_rows_by, num_rows):
+        """Index of the group of each row within group_set_, or -1 if not seen."""
+
+        if group_rows_by is None:
+            return None
+
+        group_rows_by = np.asarray(group_rows_by)
+        if len(group_rows_by) != num_rows:
+            raise ValueError('Grouping variable for samples/rows must have {} elements'
+                             ''.format(num_rows))
+        position = np.searchsorted(self.group_set_, group_rows_by)
+        position = np.minimum(position, len(self.group_set_) - 1)
+        seen = self.group_set_[position] == group_rows_by
+
+        return np.where(seen, position, -1)
+
+
+    def _draw(self, values, cell_flag, group_index):
+        """Fills the missing values of each variable with one vectorized draw."""
+
+        rng = np.random.default_rng(self.seed)
+        for col in np.flatnonzero(cell_flag.any(axis=0)):
+            donors = self.donor_rows_[col]
+            if len(donors) < 1:
+                continue
+            rows = np.flatnonzero(cell_flag[:, col])
+
+            offsets = self.donor_offsets_[col]
+            start = np.zeros(len(rows), dtype='intp')
+            count = np.full(len(rows), len(donors), dtype='intp')
+            if group_index is not None:
+                groups = group_index[rows]
+                in_group = groups >= 0
+                group_start = offsets[groups[in_group]]
+                group_count = offsets[groups[in_group] + 1] - group_start
+                # groups without donors draw from all of them
+                has_donors = group_count > 0
+                start[np.flatnonzero(in_group)[has_donors]] = group_start[has_donors]
+                count[np.flatnonzero(in_group)[has_donors]] = group_count[has_donors]
+
+            picked = start + (rng.random(len(rows)) * count).astype('intp')
+            values[rows, col] = self.values_[donors[picked], col]
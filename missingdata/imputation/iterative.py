@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+"""
+Iterative imputation by chained equations (MICE), with independent chains run in
+parallel worker processes.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from missingdata.imputation.base import BaseImputer, _check_values
+
+
+class IterativeImputer(BaseImputer):
+    """Imputes each variable in turn by regression on all the others, iteratively.
+
+    Each chain starts by filling the missing values of each variable with random
+    draws from its observed values (or its mean, without sample_posterior), and
+    then sweeps over the variables with missing values, regressing each one on all
+    the others (over the rows where it is observed) and replacing its missing
+    values with the predictions. With sample_posterior, the coefficients and the
+    residuals are drawn from their posterior (as in Bayesian linear regression,
+    ``mice.norm``), so that independent chains yield proper multiple imputations.
+
+    The normal equations of every regression come from a single Gram matrix of the
+    current values, updated by one matrix-vector product when a variable is imputed,
+    minus the contribution of the rows where the variable is missing. Each variable
+    then costs O(num_rows x num_cols + num_missing x num_cols^2) per sweep (plus a
+    solve of size num_cols), where num_missing is its number of missing values,
+    instead of O(num_rows x num_cols^2) to form its normal equations from scratch.
+
+    Chains are independent, and run in a pool of processes with num_workers > 1.
+    The data is placed once in shared memory for all of them to read, instead of
+    being pickled for each chain. Seeds of the chains are spawned from seed, so the
+    results do not depend on the number of workers.
+
+    Parameters
+    ----------
+    num_chains : int
+        Number of independent chains (imputations). Default: 1
+
+    max_iter : int
+        Number of sweeps over the variables in each chain. Default: 10
+
+    tol : float
+        Without sample_posterior, chains stop early when the largest change in the
+        imputed values (relative to the std. dev. of their variable) falls below this.
+        Default: 1e-3
+
+    sample_posterior : bool
+        Flag to draw imputations from the posterior predictive distribution, rather
+        than use the conditional means. Default: True
+
+    num_workers : int
+        Number of processes to run the chains in (needs Python 3.8 or later).
+        Default: 1, within this process
+
+    seed : int or None
+        Seed for the random draws, from which the seeds of the chains are spawned.
+        Default: 0
+
+    copy : bool
+        If False, float32/float64 arrays are imputed in place. Default: True
+
+    Attributes
+    ----------
+    imputations_ : ndarray
+        of shape (num_chains, num_missing), values imputed by each chain during fit,
+        for the missing cells of the data in row-major order (as in ``np.nonzero``)
+
+    chain_means_ : ndarray
+        of shape (num_chains, max_iter, num_cols), mean of the imputed values of
+        each variable after each sweep, to diagnose convergence. NaN for variables
+        without missing values, or sweeps after stopping early.
+
+    rhat_ : ndarray
+        of shape (num_cols, ), potential scale reduction factor (Gelman-Rubin) of
+        the chain means over the second half of the sweeps. Values close to 1
+        indicate the chains have mixed. NaN with fewer than 2 chains.
+
+    n_iter_ : ndarray
+        of shape (num_chains, ), number of sweeps run in each chain
+
+    """
+
+    def __init__(self,
+                 num_chains=1,
+                 max_iter=10,
+                 tol=1e-3,
+                 sample_posterior=True,
+                 num_workers=1,
+                 seed=0,
+                 copy=True):
+
+        if int(num_chains) < 1:
+            raise ValueError('num_chains must be at least 1')
+        if int(max_iter) < 1:
+            raise ValueError('max_iter must be at least 1')
+        if int(num_workers) < 1:
+            raise ValueError('num_workers must be at least 1')
+
+        self.num_chains = int(num_chains)
+        self.max_iter = int(max_iter)
+        self.tol = tol
+        self.sample_posterior = sample_posterior
+        self.num_workers = int(num_workers)
+        self.seed = seed
+        self.copy = copy
+
+
+    def fit(self, data):
+        """Runs the chains over data, recording their imputations and diagnostics."""
+
+        values = _check_values(data, copy=False).astype('float64')
+        cell_flag = np.isnan(values)
+        if (cell_flag.all(axis=0)).any():
+            raise ValueError('Some variables have no observed values!')
+
+        chain_seeds = np.random.SeedSequence(self.seed).spawn(self.num_chains)
+        settings = (self.max_iter, self.tol, self.sample_posterior)
+
+        if self.num_workers > 1 and self.num_chains > 1:
+            results = _run_chains_shared(values, chain_seeds, settings,
+                                         self.num_workers)
+        else:
+            results = [_run_chain(values, chain_seed, *settings)
+                       for chain_seed in chain_seeds]
+
+        imputations, chain_means, coefs, num_iters = zip(*results)
+        self.imputations_ = np.vstack(imputations)
+        self.chain_means_ = np.stack(chain_means)
+        self.n_iter_ = np.array(num_iters)
+        self.rhat_ = _gelman_rubin(self.chain_means_, self.n_iter_)
+        # pooled over chains, for imputing new data
+        self.coef_ = np.mean(coefs, axis=0)
+        self.center_ = np.nanmean(values, axis=0)
+        self.num_cols_ = values.shape[1]
+
+        return self
+
+
+    def _impute(self, values, cell_flag):
+        """Sweeps the conditional means from the pooled regressions over the data."""
+
+        missing_cols = np.flatnonzero(cell_flag.any(axis=0))
+        if len(missing_cols) < 1:
+            return
+
+        current = np.where(cell_flag, 0.0, values - self.center_)
+        design = np.hstack((np.ones((current.shape[0], 1)), current))
+        stds = np.nanstd(values, axis=0)
+        stds[~(stds > 0)] = 1.0
+
+        for _ in range(self.max_iter):
+            change = 0.0
+            for col in missing_cols:
+                rows = np.flatnonzero(cell_flag[:, col])
+                others = np.r_[0, np.arange(self.num_cols_) + 1] != col + 1
+                predicted = design[np.ix_(rows, others)] @ self.coef_[col]
+                change = max(change, np.abs(predicted - design[rows, col + 1]).max()
+                             / stds[col])
+                design[rows, col + 1] = predicted
+            if change < self.tol:
+                break
+
+        rows, cols = np.nonzero(cell_flag)
+        values[rows, cols] = design[rows, cols + 1] + self.center_[cols]
+
+
+def _run_chains_shared(values, chain_seeds, settings, num_workers):
+    """Runs the chains in a pool of processes, sharing the values in memory."""
+
+    # imported here, so the rest of the package works without it (Python < 3.8)
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError('Running chains in worker processes (num_workers > 1) '
+                          'needs multiprocessing.shared_memory, from Python 3.8')
+
+    shared = shared_memory.SharedMemory(create=True, size=values.nbytes)
+    try:
+        shared_values = np.ndarray(values.shape, dtype=values.dtype, buffer=shared.buf)
+        shared_values[:] = values
+        del shared_values
+        with ProcessPoolExecutor(num_workers) as pool:
+            futures = [pool.submit(_run_chain_shared, shared.name, values.shape,
+                                   values.dtype.str, chain_seed, settings)
+                       for chain_seed in chain_seeds]
+            results = [future.result() for future in futures]
+    finally:
+        shared.close()
+        shared.unlink()
+
+    return results
+
+
+def _run_chain_shared(shared_name, shape, dtype, chain_seed, settings):
+    """Runs a chain in a worker process, on values read from shared memory."""
+
+    from multiprocessing import shared_memory
+
+    shared = shared_memory.SharedMemory(name=shared_name)
+    values = np.ndarray(shape, dtype=dtype, buffer=shared.buf)
+    try:
+        return _run_chain(values, chain_seed, *settings)
+    finally:
+        # views of the buffer must be released before closing it
+        del values
+        shared.close()
+
+
+def _run_chain(values, chain_seed, max_iter, tol, sample_posterior):
+    """Runs one chain of chained equations, without modifying values.
+
+    Returns
+    -------
+    imputations : ndarray
+        imputed values, for the missing cells in row-major order
+
+    chain_means : ndarray
+        of shape (max_iter, num_cols), mean of the imputed values after each sweep
+
+    coef : ndarray
+        of shape (num_cols, num_cols), final regression of each variable on the
+        others (with the intercept first), on values centered by their means
+
+    num_iter : int
+        number of sweeps run
+
+    """
+
+    rng = np.random.default_rng(chain_seed)
+    num_rows, num_cols = values.shape
+    cell_flag = np.isnan(values)
+    center = np.nanmean(values, axis=0)
+    stds = np.nanstd(values, axis=0)
+    stds[~(stds > 0)] = 1.0
+
+    # intercept in the first column, values centered for precision of the Gram matrix
+    design = np.empty((num_rows, num_cols + 1))
+    design[:, 0] = 1.0
+    design[:, 1:] = values - center
+    missing_cols = np.flatnonzero(cell_flag.any(axis=0))
+    missing_rows = {col: np.flatnonzero(cell_flag[:, col]) for col in missing_cols}
+    for col in missing_cols:
+        rows = missing_rows[col]
+        if sample_posterior:
+            observed = design[~cell_flag[:, col], col + 1]
+            design[rows, col + 1] = rng.choice(observed, len(rows))
+        else:
+            design[rows, col + 1] = 0.0
+    gram = design.T @ design
+
+    # fewest missing first
+    missing_cols = missing_cols[np.argsort(cell_flag[:, missing_cols].sum(axis=0),
+                                           kind='stable')]
+    chain_means = np.full((max_iter, num_cols), np.nan)
+    for num_iter in range(1, max_iter + 1):
+        change = 0.0
+        for col in missing_cols:
+            rows = missing_rows[col]
+            target, others = _split_target(num_cols, col)
+            coef, precision, rss, dof = _normal_equations(gram, design[rows], target,
+                                                          others, num_rows)
+            predictors = design[np.ix_(rows, others)]
+            if sample_posterior and dof > 0:
+                sigma = np.sqrt(rss / rng.chisquare(dof))
+                chol = np.linalg.cholesky(np.linalg.inv(precision))
+                coef = coef + sigma * chol @ rng.standard_normal(len(coef))
+                predicted = predictors @ coef + sigma * rng.standard_normal(len(rows))
+            else:
+                predicted = predictors @ coef
+
+            change = max(change,
+                         np.abs(predicted - design[rows, target]).max() / stds[col])
+            design[rows, target] = predicted
+            updated = design.T @ design[:, target]
+            gram[:, target] = updated
+            gram[target, :] = updated
+            chain_means[num_iter - 1, col] = predicted.mean() + center[col]
+
+        if not sample_posterior and change < tol:
+            break
+
+    coefs = np.zeros((num_cols, num_cols))
+    for col in range(num_cols):
+        target, others = _split_target(num_cols, col)
+        rows = missing_rows.get(col, np.zeros(0, dtype='int64'))
+        coefs[col] = _normal_equations(gram, design[rows], target, others,
+                                       num_rows)[0]
+
+    rows, cols = np.nonzero(cell_flag)
+    imputations = design[rows, cols + 1] + center[cols]
+
+    return imputations, chain_means, coefs, num_iter
+
+
+def _split_target(num_cols, col):
+    """Position of the variable in the design, and a mask of its predictors."""
+
+    target = col + 1
+    others = np.ones(num_cols + 1, dtype=bool)
+    others[target] = False
+
+    return target, others
+
+
+def _normal_equations(gram, excluded, target, others, num_rows):
+    """Least squares of the target on the others, over the rows not excluded.
+
+    The Gram matrix over the rows used is that over all the rows minus the
+    contribution of the excluded ones, costing O(num_excluded x num_cols^2).
+    """
+
+    gram = gram - excluded.T @ excluded
+    precision = gram[np.ix_(others, others)]
+    cross = gram[others, target]
+    # tiny ridge, for collinear variables
+    precision = precision + 1e-8 * max(np.trace(precision), 1.0) * \
+                np.eye(len(precision))
+    coef = np.linalg.solve(precision, cross)
+    rss = max(gram[target, target] - 2 * coef @ cross + coef @ precision @ coef, 0.0)
+    dof = num_rows - len(excluded) - len(coef)
+
+    return coef, precision, rss, dof
+
+
+def _gelman_rubin(chain_means, num_iters):
+    """Potential scale reduction factor over the second half of the sweeps."""
+
+    num_chains, _, num_cols = chain_means.shape
+    rhat = np.full(num_cols, np.nan)
+
+    # only the sweeps run by all the chains
+    num_sweeps = min(num_iters)
+    half = chain_means[:, num_sweeps // 2:num_sweeps]
+    length = half.shape[1]
+    if num_chains < 2 or length < 2:
+        return rhat
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        within = half.var(axis=1, ddof=1).mean(axis=0)
+        between = length * half.mean(axis=1).var(axis=0, ddof=1)
+        pooled = (length - 1) / length * within + between / length
+        rhat = np.sqrt(pooled / within)
+
+    return rhat
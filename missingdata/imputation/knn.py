@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+K-nearest neighbours imputation, with NaN-aware distances computed in tiles of
+rows, within a bounded amount of memory.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from missingdata import config as cfg
+from missingdata.imputation.base import BaseImputer, _check_values
+
+
+class KNNImputer(BaseImputer):
+    """Fills missing values with the mean of those in the nearest rows (donors).
+
+    Distances are NaN-aware Euclidean distances over the variables observed in both
+    rows, scaled up by the fraction of variables in common, i.e.
+    ``sqrt(num_cols / num_common * sum_common (x - y)^2)``. They are computed for
+    a tile of query rows against a tile of reference rows at a time, via matrix
+    products of the zero-filled values, their squares and the observed indicators.
+    Only a running top-k of donors (those with the variable observed) is kept for
+    each query row and variable, so the (num_rows x num_rows) distance matrix is
+    never held in memory.
+
+    Parameters
+    ----------
+    num_neighbors : int
+        Number of donors (k) for each missing value. Default: 5
+
+    weights : str
+        'uniform' for the plain mean of donors, or 'distance' to weight them by the
+        inverse of their distance. Default: 'uniform'
+
+    max_memory : int or None
+        Approximate memory budget (in bytes) for the distances of a pair of tiles,
+        per worker. Default: None, using the budget in missingdata.config
+
+    num_workers : int
+        Number of threads imputing tiles of query rows in parallel.
+        Default: 1
+
+    copy : bool
+        If False, float32/float64 arrays are imputed in place. Default: True
+
+    """
+
+    def __init__(self,
+                 num_neighbors=5,
+                 weights='uniform',
+                 max_memory=None,
+                 num_workers=1,
+                 copy=True):
+
+        if int(num_neighbors) < 1:
+            raise ValueError('num_neighbors must be at least 1')
+        if weights not in ('uniform', 'distance'):
+            raise ValueError("weights must be either 'uniform' or 'distance'")
+        if int(num_workers) < 1:
+            raise ValueError('num_workers must be at least 1')
+
+        self.num_neighbors = int(num_neighbors)
+        self.weights = weights
+        self.max_memory = max_memory
+        self.num_workers = int(num_workers)
+        self.copy = copy
+
+
+    def fit(self, data):
+        """Stores (a copy of) the data, to find donors in."""
+
+        self.reference_ = _check_values(data, copy=True)
+        self.num_cols_ = self.reference_.shape[1]
+
+        # for values without any donors
+        ref_missing = np.isnan(self.reference_)
+        has_obs = ~ref_missing.all(axis=0)
+        self.col_means_ = np.full(self.num_cols_, np.nan)
+        self.col_means_[has_obs] = np.nanmean(self.reference_[:, has_obs], axis=0)
+
+        return self
+
+
+    def _impute(self, values, cell_flag):
+
+        rows_to_impute = np.flatnonzero(cell_flag.any(axis=1))
+        if len(rows_to_impute) < 1:
+            return
+
+        tile_size = self._tile_size()
+        tiles = [rows_to_impute[start:start + tile_size]
+                 for start in range(0, len(rows_to_impute), tile_size)]
+
+        def impute_tile(rows):
+            return rows, self._impute_tile(values[rows], cell_flag[rows], tile_size)
+
+        if self.num_workers > 1:
+            with ThreadPoolExecutor(self.num_workers) as pool:
+                results = list(pool.map(impute_tile, tiles))
+        else:
+            results = map(impute_tile, tiles)
+
+        for rows, imputed in results:
+            values[rows] = imputed
+
+
+    def _tile_size(self):
+        """Number of rows per tile, so the distances for a pair of tiles fit the budget."""
+
+        budget = cfg.CHUNK_SIZE_BYTES if self.max_memory is None else self.max_memory
+        # about 8 float64 arrays of (tile x tile), and the tiles of values
+        by_distances = int(np.sqrt(budget / (8 * 8)))
+        by_values = int(budget // (8 * 8 * max(self.num_cols_, 1)))
+
+        return max(1, min(by_distances, by_values))
+
+
+    def _impute_tile(self, query, query_flag, tile_size):
+        """Imputes a tile of query rows, from a running top-k over reference tiles."""
+
+        query = query.astype('float64')
+        query_obs = (~query_flag).astype('float64')
+        query_filled = np.where(query_flag, 0.0, query)
+        query_sq = query_filled ** 2
+
+        missing_cols = np.flatnonzero(query_flag.any(axis=0))
+        rows_missing = {col: np.flatnonzero(query_flag[:, col]) for col in missing_cols}
+        best_dist = {col: np.zeros((len(rows_missing[col]), 0)) for col in missing_cols}
+        best_idx = {col: np.zeros((len(rows_missing[col]), 0), dtype='int64')
+                    for col in missing_cols}
+
+        num_ref = self.reference_.shape[0]
+        for start in range(0, num_ref, tile_size):
+            ref = self.reference_[start:start + tile_size].astype('float64')
+            ref_flag = np.isnan(ref)
+            ref_obs = (~ref_flag).astype('float64')
+            ref_filled = np.where(ref_flag, 0.0, ref)
+
+            num_common = query_obs @ ref_obs.T
+            sq_dist = query_sq @ ref_obs.T + query_obs @ (ref_filled ** 2).T \
+                      - 2 * query_filled @ ref_filled.T
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dist = np.sqrt(np.maximum(sq_dist, 0.0) * self.num_cols_ / num_common)
+            dist[num_common < 1] = np.inf
+
+            ref_idx = np.arange(start, start + ref.shape[0])
+            for col in missing_cols:
+                # donors must have this variable observed
+                donors = ~ref_flag[:, col]
+                col_dist = dist[np.ix_(rows_missing[col], np.flatnonzero(donors))]
+                col_idx = np.broadcast_to(ref_idx[donors], col_dist.shape)
+                best_idx[col], best_dist[col] = _merge_nearest(
+                    np.hstack((best_idx[col], col_idx)),
+                    np.hstack((best_dist[col], col_dist)),
+                    self.num_neighbors)
+
+        imputed = query.copy()
+        for col in missing_cols:
+            dist = best_dist[col]
+            valid = np.isfinite(dist)
+            donor_values = self.reference_[best_idx[col], col].astype('float64')
+            if self.weights == 'distance':
+                with np.errstate(divide='ignore'):
+                    weights = np.where(dist > 0, 1.0 / dist, np.inf)
+                # exact matches get all the weight
+                exact = np.isinf(weights)
+                weights = np.where(exact.any(axis=1, keepdims=True),
+                                   exact.astype('float64'), weights)
+            else:
+                weights = np.ones_like(dist)
+            weights = np.where(valid, weights, 0.0)
+
+            total_weight = weights.sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fill = (weights * np.where(valid, donor_values, 0.0)).sum(axis=1) \
+                       / total_weight
+            fill[total_weight <= 0] = self.col_means_[col]
+            imputed[rows_missing[col], col] = fill
+
+        return imputed
+
+
+def _merge_nearest(candidates, candidate_dist, num_neighbors):
+    """Keeps the k nearest candidates in each row, via partial selection."""
+
+    if candidate_dist.shape[1] <= num_neighbors:
+        return candidates, candidate_dist
+
+    nearest = np.argpartition(candidate_dist, num_neighbors - 1,
+                              axis=1)[:, :num_neighbors]
+
+    return np.take_along_axis(candidates, nearest, axis=1), \
+           np.take_along_axis(candidate_dist, nearest, axis=1)
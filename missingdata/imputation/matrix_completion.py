@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+"""
+Imputation by low-rank matrix completion (SoftImpute), with randomized truncated
+SVDs.
+
+"""
+
+import numpy as np
+
+from missingdata import config as cfg
+from missingdata.imputation.base import BaseImputer, _check_values, _wrap_like
+from missingdata.mask import MissingnessMask
+from missingdata.patterns import missingness_patterns, rows_by_pattern
+
+
+class SoftImputer(BaseImputer):
+    """Fills missing values from a low-rank approximation of the data (SoftImpute).
+
+    Starting from the data with missing values filled with column means, each
+    iteration computes a truncated SVD of the current completion, soft-thresholds
+    its singular values by the shrinkage, and replaces the missing values (only)
+    with those of the resulting low-rank matrix. The observed values are never
+    modified.
+
+    The truncated SVD is randomized (range finding with a few power iterations),
+    costing O(num_rows x num_cols x rank) per iteration instead of a full SVD. The
+    range is warm-started from the right singular vectors of the previous
+    iteration, and the completion is stored in float32. Given a sequence of
+    shrinkage values, they are solved from the largest to the smallest, each
+    starting from the solution of the previous one.
+
+    Mazumder, R., Hastie, T., & Tibshirani, R. (2010). Spectral regularization
+    algorithms for learning large incomplete matrices. JMLR, 11, 2287-2322.
+
+    Parameters
+    ----------
+    shrinkage : float or sequence of floats or None
+        Amount (lambda) subtracted from the singular values. A sequence defines a
+        regularization path, and the smallest value gives the final fit.
+        Default: None, 1% of the largest singular value of the mean-filled data.
+
+    rank : int
+        Maximum rank of the approximation. Default: 10
+
+    max_iter : int
+        Maximum number of iterations for each shrinkage value. Default: 100
+
+    tol : float
+        Iterations stop when the relative change in the imputed values falls below
+        this. Default: 1e-4
+
+    num_oversamples : int
+        Extra dimensions of the randomized range, improving its accuracy. Default: 10
+
+    num_power_iter : int
+        Number of power iterations of the randomized SVD. Default: 2
+
+    seed : int or None
+        Seed for the random initial range. Default: 0
+
+    copy : bool
+        If False, float32/float64 arrays are imputed in place. Default: True
+
+    Attributes
+    ----------
+    mean_ : ndarray
+        of shape (num_cols, ), means of the observed values, removed before the SVD
+
+    components_ : ndarray
+        of shape (num_components, num_cols), right singular vectors of the final
+        approximation, scaled by their (shrunk) singular values
+
+    shrinkage_path_ : ndarray
+        shrinkage values solved for, in the order solved
+
+    ranks_ : ndarray
+        rank of the solution for each shrinkage value
+
+    n_iter_ : ndarray
+        number of iterations run for each shrinkage value
+
+    """
+
+    def __init__(self,
+                 shrinkage=None,
+                 rank=10,
+                 max_iter=100,
+                 tol=1e-4,
+                 num_oversamples=10,
+                 num_power_iter=2,
+                 seed=0,
+                 copy=True):
+
+        if int(rank) < 1:
+            raise ValueError('rank must be at least 1')
+        if int(max_iter) < 1:
+            raise ValueError('max_iter must be at least 1')
+
+        self.shrinkage = shrinkage
+        self.rank = int(rank)
+        self.max_iter = int(max_iter)
+        self.tol = tol
+        self.num_oversamples = int(num_oversamples)
+        self.num_power_iter = int(num_power_iter)
+        self.seed = seed
+        self.copy = copy
+
+
+    def fit(self, data):
+        """Finds the low-rank approximation of data, along the shrinkage path."""
+
+        self._fit(_check_values(data, copy=False))
+
+        return self
+
+
+    def fit_transform(self, data):
+        """Fits the imputer, and returns the completion of data found during fit."""
+
+        values = _check_values(data, copy=self.copy)
+        completed = self._fit(values)
+        rows, cols = np.nonzero(np.isnan(values))
+        values[rows, cols] = completed[rows, cols] + self.mean_[cols]
+
+        return _wrap_like(values, data)
+
+
+    def _fit(self, values):
+        """Runs SoftImpute over the path, returning the (centered) completion."""
+
+        cell_flag = np.isnan(values)
+        if cell_flag.all(axis=0).any():
+            raise ValueError('Some variables have no observed values!')
+        rows, cols = np.nonzero(cell_flag)
+
+        self.mean_ = np.nanmean(values, axis=0)
+        # cast before centering, without a float64 temporary of the whole data
+        completed = values.astype('float32')
+        completed -= self.mean_.astype('float32')
+        completed[rows, cols] = 0.0
+
+        rng = np.random.RandomState(self.seed)
+        num_dims = min(self.rank + self.num_oversamples, *values.shape)
+        right = rng.randn(values.shape[1], num_dims).astype('float32')
+
+        path = self._shrinkage_path(completed, right)
+        ranks, num_iters = list(), list()
+        for shrinkage in path:
+            # warm start: completion and range of the previous shrinkage value
+            sing_vals, right, num_iter = self._solve(completed, rows, cols, shrinkage,
+                                                     right)
+            ranks.append(np.count_nonzero(sing_vals[:self.rank]))
+            num_iters.append(num_iter)
+
+        positive = np.flatnonzero(sing_vals[:self.rank] > 0)
+        self.components_ = sing_vals[positive, np.newaxis] * right[:, positive].T
+        self.shrinkage_path_ = path
+        self.ranks_ = np.array(ranks)
+        self.n_iter_ = np.array(num_iters)
+        self.num_cols_ = values.shape[1]
+
+        return completed
+
+
+    def _shrinkage_path(self, completed, right):
+        """Shrinkage values to solve for, from the largest to the smallest."""
+
+        if self.shrinkage is None:
+            _, sing_vals, _ = _randomized_svd(completed, right, self.num_power_iter)
+            return np.array([0.01 * sing_vals[0]])
+
+        path = np.atleast_1d(np.asarray(self.shrinkage, dtype='float64'))
+        if path.ndim != 1 or len(path) < 1 or (path < 0).any():
+            raise ValueError('shrinkage must be a non-negative number or a sequence '
+                             'of non-negative numbers')
+
+        return np.sort(path)[::-1]
+
+
+    def _solve(self, completed, rows, cols, shrinkage, right):
+        """SoftImpute iterations for one shrinkage value, updating completed in place."""
+
+        previous = completed[rows, cols]
+        for num_iter in range(1, self.max_iter + 1):
+            left, sing_vals, right = _randomized_svd(completed, right,
+                                                     self.num_power_iter)
+            sing_vals = np.maximum(sing_vals - shrinkage, 0.0).astype('float32')
+
+            imputed = _low_rank_entries(left[:, :self.rank] * sing_vals[:self.rank],
+                                        right[:, :self.rank], rows, cols)
+            completed[rows, cols] = imputed
+
+            change = np.sqrt(np.sum((imputed - previous).astype('float64') ** 2))
+            norm = max(float(np.sqrt(np.sum(previous.astype('float64') ** 2))), 1e-12)
+            previous = imputed
+            if change / norm < self.tol:
+                break
+
+        return sing_vals, right, num_iter
+
+
+    def _impute(self, values, cell_flag):
+        """Fits each row to the components, over its observed values (per pattern)."""
+
+        patterns, _, pattern_index = missingness_patterns(MissingnessMask(cell_flag))
+        row_order, boundaries = rows_by_pattern(pattern_index, len(patterns))
+        components = self.components_.astype('float64')
+        shrinkage = self.shrinkage_path_[-1]
+
+        for pp, missing in enumerate(patterns):
+            if not missing.any():
+                continue
+            rows = row_order[boundaries[pp]:boundaries[pp + 1]]
+            observed = ~missing
+            centered = values[np.ix_(rows, observed)] - self.mean_[observed]
+            scores = _component_scores(components[:, observed], centered, shrinkage)
+            values[np.ix_(rows, missing)] = self.mean_[missing] + \
+                                            scores.T @ components[:, missing]
+
+
+def _component_scores(comp_obs, centered, shrinkage):
+    """Ridge regression of the (centered) rows on the components, over observed cells.
+
+    Without shrinkage, or with a singular system (e.g. fewer observed variables
+    than components), the minimum-norm least squares scores are returned.
+    """
+
+    if shrinkage > 0:
+        try:
+            return np.linalg.solve(comp_obs @ comp_obs.T
+                                   + shrinkage * np.eye(len(comp_obs)),
+                                   comp_obs @ centered.T)
+        except np.linalg.LinAlgError:
+            pass
+
+    return np.linalg.lstsq(comp_obs.T, centered.T, rcond=None)[0]
+
+
+def _randomized_svd(matrix, right, num_power_iter):
+    """Truncated SVD, from the range of matrix applied to the columns of right.
+
+    Returns the left singular vectors, singular values and right singular vectors
+    (as columns) for all the dimensions of right, best first, to warm start the
+    next call.
+    """
+
+    basis, _ = np.linalg.qr(matrix @ right)
+    for _ in range(num_power_iter):
+        basis, _ = np.linalg.qr(matrix.T @ basis)
+        basis, _ = np.linalg.qr(matrix @ basis)
+
+    left, sing_vals, right_t = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+
+    return basis @ left, sing_vals, right_t.T
+
+
+def _low_rank_entries(scaled_left, right, rows, cols):
+    """Entries of scaled_left @ right.T at (rows, cols), in blocks of bounded size."""
+
+    entries = np.empty(len(rows), dtype=scaled_left.dtype)
+    block_size = max(1, cfg.CHUNK_SIZE_BYTES // (8 * max(right.shape[1], 1)))
+    for start in range(0, len(rows), block_size):
+        stop = start + block_size
+        entries[start:stop] = np.einsum('ij,ij->i', scaled_left[rows[start:stop]],
+                                        right[cols[start:stop]])
+
+    return entries
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact storage of multiple imputations, and pooling of estimates over them
+(Rubin's rules).
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from missingdata.imputation.base import _check_values
+
+
+class MultipleImputations(object):
+    """Multiple imputations of a dataset, storing only the imputed cells of each.
+
+    The values of the data (with NaNs where missing) are stored once, in a copy not
+    referencing the data given, along with the index and columns of a DataFrame,
+    and an array of the values imputed in each imputation, for the missing cells
+    in row-major order (as in ``np.flatnonzero`` of the mask). With m imputations,
+    this takes m x num_missing values instead of m full copies of the data.
+    Completed datasets are materialized only when requested, one at a time.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray
+        of shape (num_rows, num_cols), with NaNs where missing
+
+    imputations : ndarray
+        of shape (num_imputations, num_missing), values imputed for the missing
+        cells of data, in row-major order e.g. ``IterativeImputer.imputations_``
+
+    """
+
+    def __init__(self, data, imputations):
+
+        # only what is needed to return DataFrames, without keeping data around
+        if isinstance(data, pd.DataFrame):
+            self.index, self.columns = data.index, data.columns
+        else:
+            self.index, self.columns = None, None
+        self.values = _check_values(data, copy=True)
+        self.flat_index = np.flatnonzero(np.isnan(self.values))
+
+        imputations = np.asarray(imputations)
+        if imputations.ndim == 1:
+            imputations = imputations[np.newaxis, :]
+        if imputations.ndim != 2 or imputations.shape[1] != len(self.flat_index):
+            raise ValueError('imputations must be of shape (num_imputations, {}), '
+                             'for the missing cells of data'
+                             ''.format(len(self.flat_index)))
+        self.imputations = imputations
+
+
+    @classmethod
+    def from_imputer(cls, imputer, data):
+        """Runs an imputer with multiple chains (e.g. IterativeImputer) over data."""
+
+        imputer.fit(data)
+        if not hasattr(imputer, 'imputations_'):
+            raise TypeError('{} does not produce multiple imputations!'
+                            ''.format(imputer.__class__.__name__))
+
+        return cls(data, imputer.imputations_)
+
+
+    @property
+    def num_imputations(self):
+        return self.imputations.shape[0]
+
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+
+    @property
+    def nbytes(self):
+        """Memory used by the data, the missing cells and their imputations."""
+
+        nbytes = self.values.nbytes + self.flat_index.nbytes + self.imputations.nbytes
+        if self.index is not None:
+            nbytes += self.index.nbytes + self.columns.nbytes
+
+        return nbytes
+
+
+    def __len__(self):
+        return self.num_imputations
+
+
+    def __getitem__(self, imp_index):
+        """Completed dataset for the given imputation, materialized on request."""
+
+        if not -self.num_imputations <= imp_index < self.num_imputations:
+            raise IndexError('There are only {} imputations!'
+                             ''.format(self.num_imputations))
+
+        completed = self.values.copy()
+        completed.flat[self.flat_index] = self.imputations[imp_index]
+
+        if self.columns is not None:
+            return pd.DataFrame(completed, index=self.index, columns=self.columns,
+                                copy=False)
+
+        return completed
+
+
+    def __iter__(self):
+
+        for imp_index in range(self.num_imputations):
+            yield self[imp_index]
+
+
+    def __repr__(self):
+
+        return '{} imputations of data of shape {}, with {} missing values' \
+               ''.format(self.num_imputations, self.shape, len(self.flat_index))
+
+
+    def pool(self, statistic):
+        """Pools estimates from each completed dataset, with Rubin's rules.
+
+        Completed datasets are materialized one at a time.
+
+        Parameters
+        ----------
+        statistic : callable
+            taking a completed dataset, and returning an estimate and its
+            (sampling) variance, as scalars or arrays of the same shape
+
+        Returns
+        -------
+        estimate, variance, dof : ndarray
+            pooled estimates, their total variance and degrees of freedom.
+            See ``rubins_rules``
+
+        """
+
+        estimates, variances = zip(*[statistic(completed) for completed in self])
+
+        return rubins_rules(estimates, variances)
+
+
+    def pooled_means(self):
+        """Pooled means of the columns, computed from the imputed cells alone.
+
+        The sums (and sums of squares) of each column are those of the observed
+        values, computed once, plus those of the imputed values, accumulated for
+        all the imputations at once with np.bincount. No completed dataset is
+        materialized.
+
+        Returns
+        -------
+        estimate, variance, dof : ndarray
+            of shape (num_cols, ), pooled means, their total variance and degrees
+            of freedom. See ``rubins_rules``
+
+        """
+
+        num_rows, num_cols = self.shape
+        observed = np.where(np.isnan(self.values), 0.0, self.values)
+        obs_sum = observed.sum(axis=0)
+        obs_sumsq = (observed ** 2).sum(axis=0)
+
+        # column of each missing cell, offset by that of each imputation
+        cols = self.flat_index % num_cols
+        bins = (np.arange(self.num_imputations)[:, np.newaxis] * num_cols + cols).ravel()
+        imputed = self.imputations.astype('float64').ravel()
+        num_bins = self.num_imputations * num_cols
+        imp_sum = np.bincount(bins, imputed, num_bins).reshape(-1, num_cols)
+        imp_sumsq = np.bincount(bins, imputed ** 2, num_bins).reshape(-1, num_cols)
+
+        means = (obs_sum + imp_sum) / num_rows
+        variances = ((obs_sumsq + imp_sumsq) - num_rows * means ** 2) / (num_rows - 1)
+
+        return rubins_rules(means, np.maximum(variances, 0.0) / num_rows)
+
+
+def rubins_rules(estimates, variances):
+    """Pools estimates from multiple imputations, with Rubin's rules.
+
+    Rubin, D. B. (1987). Multiple Imputation for Nonresponse in Surveys. Wiley.
+
+    Parameters
+    ----------
+    estimates : array-like
+        of shape (num_imputations, ...), estimate from each completed dataset
+
+    variances : array-like
+        of the same shape as estimates, their (sampling) variances
+
+    Returns
+    -------
+    estimate : ndarray
+        pooled estimate, the mean of estimates over imputations
+
+    variance : ndarray
+        total variance: the mean of within-imputation variances, plus the variance
+        between imputations inflated by (1 + 1/num_imputations)
+
+    dof : ndarray
+        degrees of freedom for t-based inference on the pooled estimate. Infinite
+        where estimates do not vary between imputations.
+
+    """
+
+    estimates = np.asarray(estimates, dtype='float64')
+    variances = np.asarray(variances, dtype='float64')
+    if estimates.shape != variances.shape:
+        raise ValueError('estimates and variances must be of the same shape!')
+    num_imp = estimates.shape[0]
+    if num_imp < 2:
+        raise ValueError('At least two imputations are needed to pool estimates!')
+
+    estimate = estimates.mean(axis=0)
+    within = variances.mean(axis=0)
+    between = estimates.var(axis=0, ddof=1)
+    variance = within + (1 + 1 / num_imp) * between
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (1 + 1 / num_imp) * between / within
+        dof = (num_imp - 1) * (1 + 1 / ratio) ** 2
+    dof = np.where(between > 0, dof, np.inf)
+
+    return estimate, variance, dof
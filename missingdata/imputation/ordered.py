@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+
+"""
+Imputation of ordered data (e.g. time series from sensors or process data), by
+interpolation or carrying values forward (LOCF) or backward, over all the
+columns at once.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from missingdata import config as cfg
+from missingdata.imputation.base import BaseImputer, _check_values
+
+
+class OrderedImputer(BaseImputer):
+    """Fills gaps in ordered data from the nearest observed values around them.
+
+    Rows are assumed to be in their natural (e.g. temporal) order, and evenly spaced.
+    For every cell, the previous and next rows with an observed value in its column
+    are found for all the columns at once, with a cumulative maximum (minimum) of
+    the row numbers of observed cells, going down (up) the rows. Missing values are
+    then filled from the values at those rows, without any per-column loops.
+
+    Gaps at the start (end) of the data have no previous (next) value, and are
+    left missing, unless method is 'bfill' ('ffill').
+
+    Parameters
+    ----------
+    method : str
+        'linear' to interpolate linearly between the values around each gap,
+        'ffill' to carry the last observed value forward (LOCF), or
+        'bfill' to carry the next observed value backward. Default: 'linear'
+
+    max_gap : int or None
+        Gaps (runs of consecutive missing values in a column) longer than this are
+        left missing. Default: None, filling gaps of any length.
+
+    copy : bool
+        If False, float32/float64 arrays are imputed in place. Default: True
+
+    """
+
+    def __init__(self, method='linear', max_gap=None, copy=True):
+
+        if method not in ('linear', 'ffill', 'bfill'):
+            raise ValueError("method must be one of 'linear', 'ffill' or 'bfill'")
+        if max_gap is not None and int(max_gap) < 1:
+            raise ValueError('max_gap must be at least 1, or None')
+
+        self.method = method
+        self.max_gap = None if max_gap is None else int(max_gap)
+        self.copy = copy
+
+
+    def fit(self, data):
+        """Records the number of columns; there is nothing else to estimate."""
+
+        self.num_cols_ = _check_values(data, copy=False).shape[1]
+
+        return self
+
+
+    def transform_chunks(self, chunks):
+        """Imputes data arriving in consecutive chunks of rows, e.g. from a large file.
+
+        The last observed value (and its row) in each column is carried from one
+        chunk to the next, so every row is scanned once. With linear interpolation,
+        backward filling or max_gap, rows at the end of a chunk in gaps not yet
+        closed are held back, and yielded with a later chunk, once the end of those
+        gaps is known. Only the open gap of a column is filled when it closes, so
+        held back rows are not scanned again. Gaps left open for a long time
+        (without max_gap) are held back in memory.
+
+        Parameters
+        ----------
+        chunks : iterable
+            of pandas DataFrames or ndarrays of shape (num_rows_in_chunk, num_cols),
+            with consecutive rows of the data, such as
+            ``pd.read_csv(path, chunksize=10000)``
+
+        Yields
+        ------
+        imputed : pandas DataFrame or ndarray
+            consecutive chunks of imputed rows, of the same type as those given.
+            Their number of rows can differ from those given, due to held back rows.
+
+        """
+
+        self._check_fitted()
+        state = _StreamState(self.num_cols_)
+        for chunk in chunks:
+            values = _check_values(chunk, copy=True)
+            if values.shape[1] != self.num_cols_:
+                raise ValueError('Data must have {} columns, as during fit!'
+                                 ''.format(self.num_cols_))
+            index = chunk.index if isinstance(chunk, pd.DataFrame) else None
+            self._advance(state, values, index)
+            imputed, index = state.release(self._held_from(state))
+            if len(imputed) > 0:
+                yield _wrap_rows(imputed, index, chunk)
+
+        if state.num_held > 0:
+            # gaps still open at the end of the data
+            for col in np.flatnonzero(state.open_gap):
+                self._fill_held(state, col, -1, np.nan, state.num_rows)
+            imputed, index = state.release(state.num_rows)
+            yield _wrap_rows(imputed, index, chunk)
+
+
+    def _impute(self, values, cell_flag):
+        """Fills whole columns at once, in blocks of columns of bounded size."""
+
+        num_rows, num_cols = values.shape
+        rows = np.arange(num_rows, dtype='int64')[:, np.newaxis]
+        block_size = max(1, int(cfg.CHUNK_SIZE_BYTES // max(1, 64 * num_rows)))
+        for start in range(0, num_cols, block_size):
+            cols = slice(start, start + block_size)
+            block_flag = cell_flag[:, cols]
+            prev_row, prev_value, next_row, next_value = \
+                _nearest_observed(values[:, cols], block_flag, -1, np.nan, 0)
+            fill_value, can_fill = self._fill_values(rows, prev_row, prev_value,
+                                                     next_row, next_value, num_rows)
+            to_fill = block_flag & can_fill
+            values[:, cols][to_fill] = fill_value[to_fill]
+
+
+    def _advance(self, state, values, index):
+        """Imputes a new chunk, and the open gaps it closes in the held back rows."""
+
+        num_rows = values.shape[0]
+        if num_rows < 1:
+            return
+
+        cell_flag = np.isnan(values)
+        prev_row, prev_value, next_row, next_value = \
+            _nearest_observed(values, cell_flag, state.prev_row, state.prev_value,
+                              state.num_rows)
+        rows = state.num_rows + np.arange(num_rows, dtype='int64')[:, np.newaxis]
+        fill_value, can_fill = self._fill_values(rows, prev_row, prev_value, next_row,
+                                                 next_value, _OPEN_END)
+        to_fill = cell_flag & can_fill
+        values[to_fill] = fill_value[to_fill]
+
+        # open gaps closed by the first observed value of their column in the chunk
+        for col in np.flatnonzero(state.open_gap & (next_row[0] >= 0)):
+            self._fill_held(state, col, next_row[0, col], next_value[0, col],
+                            _OPEN_END)
+
+        state.prev_row = prev_row[-1]
+        state.prev_value = prev_value[-1]
+        state.append(values, index)
+        state.open_gap = self._open_gaps(state)
+
+
+    def _fill_held(self, state, col, next_row, next_value, end_row):
+        """Fills the open gap at the end of a column, in the held back rows."""
+
+        gap_start = state.prev_row[col] + 1
+        rows = np.arange(gap_start, state.num_rows, dtype='int64')[:, np.newaxis]
+        fill_value, can_fill = self._fill_values(rows, state.prev_row[col],
+                                                 state.prev_value[col], next_row,
+                                                 next_value, end_row)
+        filled = np.broadcast_to(np.where(can_fill, fill_value, np.nan), rows.shape)
+        state.write_column(col, gap_start, filled[:, 0])
+
+
+    def _open_gaps(self, state):
+        """Columns with a gap at the end of the rows seen, that could still be filled."""
+
+        if self.method == 'ffill' and self.max_gap is None:
+            return np.zeros(self.num_cols_, dtype=bool)
+
+        gap_start = state.prev_row + 1
+        open_gap = gap_start < state.num_rows
+        if self.method != 'bfill':
+            open_gap &= state.prev_row >= 0
+        if self.max_gap is not None:
+            open_gap &= state.num_rows - gap_start <= self.max_gap
+
+        return open_gap
+
+
+    def _held_from(self, state):
+        """First row still held back: the start of the earliest open gap."""
+
+        if not state.open_gap.any():
+            return state.num_rows
+
+        return int(state.prev_row[state.open_gap].min()) + 1
+
+
+    def _fill_values(self, rows, prev_row, prev_value, next_row, next_value,
+                     end_row):
+        """Values to fill the cells in rows with, and whether they can be filled.
+
+        end_row is the row after the end of the data, for the length of gaps without
+        a next observed value.
+        """
+
+        has_prev = prev_row >= 0
+        has_next = next_row >= 0
+
+        if self.method == 'ffill':
+            fill_value, can_fill = prev_value, has_prev
+        elif self.method == 'bfill':
+            fill_value, can_fill = next_value, has_next
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weight = (rows - prev_row) / (next_row - prev_row)
+                fill_value = prev_value + weight * (next_value - prev_value)
+            can_fill = has_prev & has_next
+
+        if self.max_gap is not None:
+            gap_length = np.where(has_next, next_row, end_row) - prev_row - 1
+            can_fill = can_fill & (gap_length <= self.max_gap)
+
+        return fill_value, can_fill
+
+
+# end of the data, while it is not known yet (large enough not to overflow)
+_OPEN_END = np.iinfo('int64').max // 2
+
+
+class _StreamState(object):
+    """State carried between consecutive chunks of rows, and the rows held back."""
+
+    def __init__(self, num_cols):
+
+        # row (from the start of the data) and value of the last observed cell
+        self.prev_row = np.full(num_cols, -1, dtype='int64')
+        self.prev_value = np.full(num_cols, np.nan)
+        self.open_gap = np.zeros(num_cols, dtype=bool)
+        # number of rows seen, and the rows held back at the end of them
+        self.num_rows = 0
+        self.num_held = 0
+        self.held = list()
+        self.held_index = list()
+
+
+    def append(self, values, index):
+        """Holds back the rows of a new chunk, until they are released."""
+
+        self.held.append(values)
+        self.held_index.append(index)
+        self.num_rows += len(values)
+        self.num_held += len(values)
+
+
+    def write_column(self, col, start, column):
+        """Writes the values of a column, from row start to the end of the rows."""
+
+        stop = self.num_rows
+        # open gaps are at the end, so only the last few chunks are visited
+        for values in reversed(self.held):
+            if stop <= start:
+                break
+            values_start = stop - len(values)
+            first = max(start, values_start)
+            values[first - values_start:, col] = column[first - start:stop - start]
+            stop = values_start
+
+
+    def release(self, until):
+        """Returns the held back rows before row until, and their index."""
+
+        num_release = until - (self.num_rows - self.num_held)
+        values, index = list(), list()
+        while num_release > 0:
+            chunk, chunk_index = self.held[0], self.held_index[0]
+            if len(chunk) <= num_release:
+                del self.held[0], self.held_index[0]
+            else:
+                self.held[0] = chunk[num_release:]
+                if chunk_index is not None:
+                    self.held_index[0] = chunk_index[num_release:]
+                chunk = chunk[:num_release]
+                if chunk_index is not None:
+                    chunk_index = chunk_index[:num_release]
+            values.append(chunk)
+            index.append(chunk_index)
+            num_release -= len(chunk)
+            self.num_held -= len(chunk)
+
+        if len(values) < 1:
+            return np.empty((0, len(self.prev_row))), None
+        if index[0] is None:
+            return np.concatenate(values), None
+
+        return np.concatenate(values), index[0].append(index[1:])
+
+
+def _nearest_observed(values, cell_flag, init_row, init_value, offset):
+    """Rows and values of the previous and next observed cells, in each column.
+
+    Rows are counted from the start of the data (offset being that of the first row
+    in values), and are -1 where there is no such cell. Before any observed cell,
+    the previous one is given by init_row and init_value.
+    """
+
+    num_rows = values.shape[0]
+    rows = np.arange(num_rows, dtype='int64')[:, np.newaxis]
+
+    prev_local = np.maximum.accumulate(np.where(cell_flag, -1, rows), axis=0)
+    has_prev = prev_local >= 0
+    prev_row = np.where(has_prev, offset + prev_local, init_row)
+    prev_value = np.where(has_prev,
+                          np.take_along_axis(values, np.maximum(prev_local, 0), axis=0),
+                          init_value)
+
+    next_local = np.minimum.accumulate(np.where(cell_flag, num_rows, rows)[::-1],
+                                       axis=0)[::-1]
+    has_next = next_local < num_rows
+    next_row = np.where(has_next, offset + next_local, -1)
+    next_value = np.where(has_next,
+                          np.take_along_axis(values,
+                                             np.minimum(next_local, num_rows - 1),
+                                             axis=0),
+                          np.nan)
+
+    return prev_row, prev_value, next_row, next_value
+
+
+def _wrap_rows(values, index, chunk):
+    """Returns the rows in the same type of container as the chunks given."""
+
+    if isinstance(chunk, pd.DataFrame):
+        return pd.DataFrame(values, index=index, columns=chunk.columns, copy=False)
+
+    return values
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+"""
+Regression (conditional mean) imputation under a multivariate normal model,
+solved once per pattern of missingness.
+
+"""
+
+import numpy as np
+
+from missingdata.imputation.base import BaseImputer, _RunningMoments, _check_values
+from missingdata.mask import MissingnessMask
+from missingdata.patterns import missingness_patterns, rows_by_pattern
+from missingdata.stats import em_mvn
+
+
+class RegressionImputer(BaseImputer):
+    """Fills missing values with their conditional mean given the observed values.
+
+    A single mean and covariance are estimated (by EM) during fit. Rows sharing a
+    pattern of missingness share the same regression of the missing variables on
+    the observed ones, so the regression coefficients are solved once per pattern,
+    and all the rows of that pattern are imputed with one matrix product. The cost
+    grows with the number of patterns, rather than the number of rows.
+
+    The mean and covariance can also be updated incrementally over batches of rows
+    with ``partial_fit``, from running moments over the pairwise observed values
+    (available-case estimates, as EM would need all the data). As in
+    SimpleImputer, fit resets the running moments to those of its data, and
+    partial_fit continues from them (or from scratch, without a previous fit), so
+    the estimates after partial_fit cover all the rows seen since the last fit.
+
+    Parameters
+    ----------
+    max_iter : int
+        Maximum number of EM iterations to estimate the mean and covariance.
+        Default: 200
+
+    tol : float
+        EM stops when the largest change in the mean and covariance falls below this.
+        Default: 1e-6
+
+    warm_start : bool
+        Flag to start EM from the estimates of the previous fit, if any, e.g. when
+        refitting on updated data. Default: False
+
+    copy : bool
+        If False, float32/float64 arrays are imputed in place. Default: True
+
+    Attributes
+    ----------
+    mean_ : ndarray
+        of shape (num_cols, ), estimated mean
+
+    cov_ : ndarray
+        of shape (num_cols, num_cols), estimated covariance
+
+    """
+
+    def __init__(self, max_iter=200, tol=1e-6, warm_start=False, copy=True):
+
+        if int(max_iter) < 1:
+            raise ValueError('max_iter must be at least 1')
+
+        self.max_iter = int(max_iter)
+        self.tol = tol
+        self.warm_start = warm_start
+        self.copy = copy
+
+
+    def fit(self, data):
+        """Estimates the mean and covariance of data by EM.
+
+        Running moments of data are also computed, for partial_fit to continue from.
+        """
+
+        values = _check_values(data, copy=False)
+        init_mean, init_cov = None, None
+        if self.warm_start and hasattr(self, 'mean_'):
+            init_mean, init_cov = self.mean_, self.cov_
+
+        self.mean_, self.cov_, self.n_iter_, self.converged_ = \
+            em_mvn(values, mean=init_mean, cov=init_cov, max_iter=self.max_iter,
+                   tol=self.tol)
+        self.num_cols_ = values.shape[1]
+        self.moments_ = _RunningMoments(self.num_cols_, pairwise=True).update(values)
+
+        return self
+
+
+    def partial_fit(self, data):
+        """Updates the mean and covariance with a batch of rows.
+
+        Running counts, means and comoments over the pairwise observed values
+        (continuing from fit, if called before) are updated with one vectorized pass
+        over the batch, without needing earlier batches again. The mean and
+        covariance are then estimated from them, replacing any from EM.
+        The covariance is projected onto the nearest positive semi-definite matrix,
+        as pairwise estimates need not be.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or ndarray
+            of shape (num_rows_in_batch, num_cols), with NaNs where missing
+
+        """
+
+        values = _check_values(data, copy=False)
+        if not hasattr(self, 'num_cols_'):
+            self.moments_ = _RunningMoments(values.shape[1], pairwise=True)
+        elif values.shape[1] != self.num_cols_:
+            raise ValueError('Data must have {} columns, as during fit!'
+                             ''.format(self.num_cols_))
+
+        self.moments_.update(values)
+        cov = self.moments_.covariance
+        if np.isnan(cov).any():
+            raise ValueError('Every pair of variables must be observed together in '
+                             'at least two rows, to estimate their covariance!')
+
+        self.mean_ = self.moments_.means
+        self.cov_ = _nearest_psd(cov)
+        self.num_cols_ = values.shape[1]
+
+        return self
+
+
+    def _impute(self, values, cell_flag):
+
+        patterns, _, pattern_index = missingness_patterns(MissingnessMask(cell_flag))
+        row_order, boundaries = rows_by_pattern(pattern_index, len(patterns))
+
+        for pp, missing in enumerate(patterns):
+            if not missing.any():
+                continue
+            rows = row_order[boundaries[pp]:boundaries[pp + 1]]
+            observed = ~missing
+            if not observed.any():
+                values[np.ix_(rows, missing)] = self.mean_[missing]
+                continue
+
+            coef = _regression_coef(self.cov_, observed, missing)
+            predicted = self.mean_[missing] + \
+                        (values[np.ix_(rows, observed)] - self.mean_[observed]) @ coef
+            values[np.ix_(rows, missing)] = predicted
+
+
+def _regression_coef(cov, observed, missing):
+    """Coefficients regressing the missing variables on the observed ones."""
+
+    cov_oo = cov[np.ix_(observed, observed)]
+    cov_om = cov[np.ix_(observed, missing)]
+    try:
+        return np.linalg.solve(cov_oo, cov_om)
+    except np.linalg.LinAlgError:
+        # singular covariance e.g. with collinear variables
+        return np.linalg.lstsq(cov_oo, cov_om, rcond=None)[0]
+
+
+def _nearest_psd(cov):
+    """Nearest positive semi-definite matrix, by clipping negative eigenvalues."""
+
+    eig_vals, eig_vecs = np.linalg.eigh((cov + cov.T) / 2)
+    if eig_vals.min() >= 0:
+        return cov
+
+    return (eig_vecs * np.maximum(eig_vals, 0.0)) @ eig_vecs.T
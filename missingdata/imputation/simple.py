@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Imputation with a single statistic per column (mean, median, mode or a constant).
+
+"""
+
+import numpy as np
+
+from missingdata.imputation.base import BaseImputer, _RunningMoments, _check_values, \
+    _fill
+
+
+class SimpleImputer(BaseImputer):
+    """Fills the missing values in each column with a statistic of its observed values.
+
+    The statistics of all the columns are computed together in one vectorized
+    (NaN-aware) pass, and all the missing cells are filled with a single indexed
+    assignment through the missingness mask.
+
+    With the 'mean' (or 'constant') strategy, the imputer can also be fit
+    incrementally over batches of rows with ``partial_fit``, keeping running counts
+    and means of the columns, without ever needing earlier batches again. As in
+    RegressionImputer, fit resets the running moments to those of its data, and
+    partial_fit continues from them (or from scratch, without a previous fit), so
+    the statistics after partial_fit cover all the rows seen since the last fit.
+
+    Parameters
+    ----------
+    strategy : str
+        One of 'mean', 'median', 'most_frequent' (smallest value in case of ties) or
+        'constant'. Default: 'mean'
+
+    fill_value : float or None
+        Value to fill in, with strategy='constant'. Default: None, meaning 0.
+
+    copy : bool
+        If False, float32/float64 arrays are imputed in place, without allocating a
+        second copy of the data. Default: True
+
+    Attributes
+    ----------
+    statistics_ : ndarray
+        of shape (num_cols, ), the value filled in for each column. Columns with no
+        observed values have NaN, and remain missing after imputation.
+
+    """
+
+    strategies = ('mean', 'median', 'most_frequent', 'constant')
+
+
+    def __init__(self, strategy='mean', fill_value=None, copy=True):
+
+        if strategy not in self.strategies:
+            raise ValueError('strategy must be one of {}'.format(self.strategies))
+        self.strategy = strategy
+        self.fill_value = fill_value
+        self.copy = copy
+
+
+    def fit(self, data):
+        """Computes the statistic of each column of data."""
+
+        values = _check_values(data, copy=False)
+        num_cols = values.shape[1]
+
+        if self.strategy == 'constant':
+            fill_value = 0.0 if self.fill_value is None else self.fill_value
+            statistics = np.full(num_cols, fill_value, dtype='float64')
+        else:
+            counts = (~np.isnan(values)).sum(axis=0)
+            has_obs = counts > 0
+            statistics = np.full(num_cols, np.nan)
+            observed = values[:, has_obs] if not has_obs.all() else values
+            if self.strategy == 'mean':
+                statistics[has_obs] = np.nanmean(observed, axis=0, dtype='float64')
+                # for partial_fit to continue from
+                self.moments_ = _RunningMoments(num_cols, count=counts,
+                                                mean=statistics)
+            elif self.strategy == 'median':
+                statistics[has_obs] = np.nanmedian(observed, axis=0)
+            else:
+                statistics[has_obs] = _nan_mode(observed)
+
+        self.statistics_ = statistics
+        self.num_cols_ = num_cols
+
+        return self
+
+
+    def partial_fit(self, data):
+        """Updates the statistic of each column with a batch of rows.
+
+        Only the 'mean' and 'constant' strategies can be updated incrementally.
+        Running counts and means of the columns (continuing from fit, if called
+        before) are updated with one vectorized pass over the batch, without
+        needing earlier batches again.
+
+        Parameters
+        ----------
+        data : pandas DataFrame or ndarray
+            of shape (num_rows_in_batch, num_cols), with NaNs where missing
+
+        """
+
+        if self.strategy not in ('mean', 'constant'):
+            raise ValueError("partial_fit is only possible with the 'mean' or "
+                             "'constant' strategy, as {} needs all the data at once"
+                             "".format(self.strategy))
+
+        values = _check_values(data, copy=False)
+        if not hasattr(self, 'num_cols_'):
+            return self.fit(values)
+        if values.shape[1] != self.num_cols_:
+            raise ValueError('Data must have {} columns, as during fit!'
+                             ''.format(self.num_cols_))
+
+        if self.strategy == 'mean':
+            self.statistics_ = self.moments_.update(values).means
+
+        return self
+
+
+    def _impute(self, values, cell_flag):
+
+        _fill(values, cell_flag, self.statistics_.astype(values.dtype))
+
+
+def _nan_mode(values):
+    """Most frequent observed value in each column (smallest one, in case of ties).
+
+    Columns are counted one at a time, so only the observed values of one column
+    are copied at once. NaN for columns without any observed values.
+    """
+
+    modes = np.full(values.shape[1], np.nan)
+    for col in range(values.shape[1]):
+        column = values[:, col]
+        observed = column[~np.isnan(column)]
+        if len(observed) > 0:
+            unique, counts = np.unique(observed, return_counts=True)
+            # unique values are sorted, and argmax gives the first of the ties
+            modes[col] = unique[np.argmax(counts)]
+
+    return modes
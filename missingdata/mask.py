@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cell-wise missingness indicator, computed once from the input and shared by
+the visualizations (filtering, reordering, frequency bars and the frame).
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from missingdata import config as cfg
+
+
+class MissingnessMask(object):
+    """Boolean indicator of missingness in each cell, with row- and column-wise counts.
+
+    The mask is built only once from the input data. Downstream operations refer to
+    subsets of it with arrays of row and column indices, instead of recomputing the
+    indicator or copying the data.
+
+    Parameters
+    ----------
+    cell_flag : ndarray of bool
+        of shape (num_rows, num_cols), True where the data is missing.
+
+    """
+
+    def __init__(self, cell_flag):
+
+        cell_flag = np.asarray(cell_flag, dtype=bool)
+        if cell_flag.ndim != 2:
+            raise ValueError('Missingness mask must be a 2D matrix!')
+
+        self.cell_flag = cell_flag
+        self.num_rows, self.num_cols = cell_flag.shape
+        self.row_counts = cell_flag.sum(axis=1)
+        self.col_counts = cell_flag.sum(axis=0)
+
+
+    @classmethod
+    def from_data(cls, data):
+        """Builds the mask from a DataFrame or array, unless it is already a mask."""
+
+        if isinstance(data, MissingnessMask):
+            return data
+
+        if isinstance(data, pd.DataFrame):
+            cell_flag = data.isnull().values
+        else:
+            cell_flag = pd.isnull(np.asarray(data))
+
+        return cls(cell_flag)
+
+
+    def pack(self):
+        """Returns a bit-packed copy of this mask, storing eight cells per byte."""
+
+        return PackedMissingnessMask.from_data(self)
+
+
+    @property
+    def shape(self):
+        return self.num_rows, self.num_cols
+
+
+    @property
+    def row_freq(self):
+        """Fraction of variables missing in each sample."""
+        return self.row_counts / max(self.num_cols, 1)
+
+
+    @property
+    def col_freq(self):
+        """Fraction of samples missing in each variable."""
+        return self.col_counts / max(self.num_rows, 1)
+
+
+    def to_array(self, row_idx=None, col_idx=None):
+        """Returns the boolean indicator for the selected rows and columns.
+
+        This is the only place a (sub)matrix of the mask gets materialized.
+        """
+
+        row_idx = _check_index(row_idx, self.num_rows)
+        col_idx = _check_index(col_idx, self.num_cols)
+
+        if row_idx is None and col_idx is None:
+            return self.cell_flag
+        if col_idx is None:
+            return self.cell_flag[row_idx, :]
+        if row_idx is None:
+            return self.cell_flag[:, col_idx]
+
+        return self.cell_flag[np.ix_(row_idx, col_idx)]
+
+
+    def to_image(self, row_idx=None, col_idx=None):
+        """Returns the selected submatrix as a uint8 image of 0s and 1s (1=missing)."""
+
+        return self.to_array(row_idx, col_idx).view('uint8')
+
+
+    def take(self, row_idx=None, col_idx=None):
+        """Returns a new mask with only the selected rows and columns, in that order."""
+
+        return MissingnessMask(self.to_array(row_idx, col_idx))
+
+
+    def iter_row_blocks(self, row_idx=None, col_idx=None, block_size=None):
+        """Yields the selected submatrix of the mask, a block of rows at a time.
+
+        Peak memory is bounded by the block size, not the size of the selection.
+        """
+
+        row_idx = _check_index(row_idx, self.num_rows)
+        col_idx = _check_index(col_idx, self.num_cols)
+        num_rows = self.num_rows if row_idx is None else len(row_idx)
+        num_cols = self.num_cols if col_idx is None else len(col_idx)
+
+        if block_size is None:
+            block_size = _rows_per_block(num_cols)
+
+        for start in range(0, num_rows, block_size):
+            stop = min(start + block_size, num_rows)
+            block_rows = np.arange(start, stop) if row_idx is None \
+                else row_idx[start:stop]
+            yield start, self.to_array(block_rows, col_idx)
+
+
+    def counts(self, row_idx=None, col_idx=None):
+        """Row- and column-wise counts of missing cells, within the selected submatrix."""
+
+        row_idx = _check_index(row_idx, self.num_rows)
+        col_idx = _check_index(col_idx, self.num_cols)
+
+        if row_idx is None and col_idx is None:
+            return self.row_counts, self.col_counts
+
+        num_rows = self.num_rows if row_idx is None else len(row_idx)
+        num_cols = self.num_cols if col_idx is None else len(col_idx)
+        sub_row_counts = np.zeros(num_rows, dtype='int64')
+        sub_col_counts = np.zeros(num_cols, dtype='int64')
+        for start, block in self.iter_row_blocks(row_idx, col_idx):
+            sub_row_counts[start:start+block.shape[0]] = block.sum(axis=1)
+            sub_col_counts += block.sum(axis=0)
+
+        return sub_row_counts, sub_col_counts
+
+
+    def block_reduce(self, row_idx=None, col_idx=None, out_shape=(1000, 1000),
+                     reduction='fraction'):
+        """Bins the selected submatrix into blocks of (at most) out_shape pixels.
+
+        Parameters
+        ----------
+        row_idx, col_idx : ndarray of int
+            Rows and columns to select, in that order. Default: all of them.
+
+        out_shape : (int, int)
+            Maximum number of blocks along rows and columns. An axis shorter than
+            this is not binned at all.
+
+        reduction : str
+            'fraction' for the fraction of cells missing in each block,
+            or 'any' to flag blocks with any missing cells.
+
+        Returns
+        -------
+        blocks : ndarray of float32
+            of shape (num_row_blocks, num_col_blocks), with values in [0, 1]
+
+        """
+
+        if reduction not in ('fraction', 'any'):
+            raise ValueError("reduction must be either 'fraction' or 'any'")
+
+        row_idx = _check_index(row_idx, self.num_rows)
+        col_idx = _check_index(col_idx, self.num_cols)
+        num_rows = self.num_rows if row_idx is None else len(row_idx)
+        num_cols = self.num_cols if col_idx is None else len(col_idx)
+
+        row_edges = _block_edges(num_rows, out_shape[0])
+        col_edges = _block_edges(num_cols, out_shape[1])
+        sums = block_sums(self.iter_row_blocks(row_idx, col_idx), row_edges, col_edges)
+
+        if reduction == 'any':
+            return (sums > 0).astype('float32')
+
+        sizes = np.outer(np.diff(row_edges), np.diff(col_edges))
+        return (sums / sizes).astype('float32')
+
+
+class PackedMissingnessMask(MissingnessMask):
+    """Bit-packed missingness mask, storing eight cells per byte.
+
+    Each row is packed along the columns (as in ``np.packbits(cell_flag, axis=1)``),
+    so the mask needs 1/8 of the memory of its boolean counterpart. Row and column
+    counts are computed from the packed bytes, without unpacking them, and only the
+    selections that get displayed are ever expanded to a byte per cell.
+
+    Parameters
+    ----------
+    packed : ndarray of uint8
+        of shape (num_rows, ceil(num_cols/8)), with the padding bits set to 0
+
+    num_cols : int
+        Number of columns (cells) in each row of the mask
+
+    """
+
+    def __init__(self, packed, num_cols):
+
+        packed = np.asarray(packed, dtype='uint8')
+        if packed.ndim != 2 or packed.shape[1] != _num_bytes(num_cols):
+            raise ValueError('Packed mask must be a 2D matrix with {} bytes per row!'
+                             ''.format(_num_bytes(num_cols)))
+
+        self.packed = packed
+        self.num_rows, self.num_cols = packed.shape[0], int(num_cols)
+        self.row_counts, self.col_counts = _packed_counts(packed, self.num_cols)
+
+
+    @classmethod
+    def from_data(cls, data):
+        """Builds the packed mask from a DataFrame, array or mask, a block at a time.
+
+        The full boolean indicator is never held in memory, only a block of rows.
+        """
+
+        if isinstance(data, PackedMissingnessMask):
+            return data
+
+        if isinstance(data, MissingnessMask):
+            num_rows, num_cols = data.shape
+            blocks = (block for _, block in data.iter_row_blocks())
+        else:
+            if not isinstance(data, pd.DataFrame):
+                data = np.asarray(data)
+            if data.ndim != 2:
+                raise ValueError('Input data must be 2D matrix!')
+            num_rows, num_cols = data.shape
+            blocks = _isnull_blocks(data, _rows_per_block(num_cols))
+
+        packed = np.zeros((num_rows, _num_bytes(num_cols)), dtype='uint8')
+        start = 0
+        for block in blocks:
+            packed[start:start+block.shape[0]] = np.packbits(block, axis=1)
+            start += block.shape[0]
+
+        return cls(packed, num_cols)
+
+
+    def pack(self):
+
+        return self
+
+
+    def to_array(self, row_idx=None, col_idx=None):
+
+        return self.to_image(row_idx, col_idx).view(bool)
+
+
+    def to_image(self, row_idx=None, col_idx=None):
+
+        row_idx = _check_index(row_idx, self.num_rows)
+        col_idx = _check_index(col_idx, self.num_cols)
+
+        packed = self.packed if row_idx is None else self.packed[row_idx, :]
+        if col_idx is None:
+            return np.unpackbits(packed, axis=1, count=self.num_cols)
+
+        # extracting the selected bits directly, to avoid unpacking all the columns
+        shift = (7 - (col_idx & 7)).astype('uint8')
+        return (packed[:, col_idx >> 3] >> shift) & np.uint8(1)
+
+
+    def take(self, row_idx=None, col_idx=None):
+
+        row_idx = _check_index(row_idx, self.num_rows)
+        col_idx = _check_index(col_idx, self.num_cols)
+
+        if col_idx is None:
+            packed = self.packed if row_idx is None else self.packed[row_idx, :]
+            return PackedMissingnessMask(packed, self.num_cols)
+
+        num_rows = self.num_rows if row_idx is None else len(row_idx)
+        packed = np.zeros((num_rows, _num_bytes(len(col_idx))), dtype='uint8')
+        for start, block in self.iter_row_blocks(row_idx, col_idx):
+            packed[start:start+block.shape[0]] = np.packbits(block, axis=1)
+
+        return PackedMissingnessMask(packed, len(col_idx))
+
+
+# number of bits set in each possible value of a byte
+_POPCOUNT = np.array([bin(val).count('1') for val in range(256)], dtype='uint8')
+
+
+def _packed_counts(packed, num_cols):
+    """Row and column counts of set bits in a row-wise packed mask, via popcounts."""
+
+    num_rows, num_bytes = packed.shape
+    row_counts = np.zeros(num_rows, dtype='int64')
+    byte_col_counts = np.zeros((8, num_bytes), dtype='int64')
+    block_size = _rows_per_block(num_bytes)
+    for start in range(0, num_rows, block_size):
+        block = packed[start:start+block_size]
+        row_counts[start:start+block_size] = _POPCOUNT[block].sum(axis=1,
+                                                                   dtype='int64')
+        # bit 7 (MSB) of byte j holds column 8j, bit 6 holds column 8j+1 and so on
+        for bit in range(8):
+            bits = (block >> np.uint8(7 - bit)) & np.uint8(1)
+            byte_col_counts[bit] += bits.sum(axis=0, dtype='int64')
+
+    col_counts = byte_col_counts.T.ravel()[:num_cols]
+
+    return row_counts, col_counts
+
+
+def block_sums(row_blocks, row_edges, col_edges):
+    """Sums of a 2D array within rectangular blocks, from its blocks of rows.
+
+    Parameters
+    ----------
+    row_blocks : iterable
+        of (start, block) pairs, with consecutive blocks of rows of the 2D array,
+        starting at row ``start``, as yielded by ``MissingnessMask.iter_row_blocks``
+
+    row_edges, col_edges : ndarray of int
+        Increasing boundaries of the blocks, starting at 0 and ending at the number
+        of rows (or columns), as from ``np.linspace(0, length, num_blocks+1)``
+
+    Returns
+    -------
+    sums : ndarray of float64
+        of shape (len(row_edges)-1, len(col_edges)-1)
+
+    """
+
+    sums = np.zeros((len(row_edges) - 1, len(col_edges) - 1), dtype='float64')
+    for start, block in row_blocks:
+        if block.shape[0] < 1:
+            continue
+        col_sums = np.add.reduceat(block, col_edges[:-1], axis=1, dtype='float64')
+        # rows in a block are contiguous, so they fall into consecutive row bins
+        rows = np.arange(start, start + block.shape[0])
+        bins = np.searchsorted(row_edges, rows, side='right') - 1
+        first_in_bin = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        sums[bins[first_in_bin]] += np.add.reduceat(col_sums, first_in_bin, axis=0)
+
+    return sums
+
+
+def block_mean(array, out_shape):
+    """Downsamples a 2D array (e.g. memory-mapped) to at most out_shape, via block means.
+
+    The array is read a block of rows at a time, so it need not fit in memory.
+    """
+
+    num_rows, num_cols = array.shape
+    row_edges = _block_edges(num_rows, out_shape[0])
+    col_edges = _block_edges(num_cols, out_shape[1])
+
+    block_size = _rows_per_block(num_cols, bytes_per_cell=array.dtype.itemsize)
+    row_blocks = ((start, np.asarray(array[start:start + block_size]))
+                  for start in range(0, num_rows, block_size))
+    sums = block_sums(row_blocks, row_edges, col_edges)
+
+    return sums / np.outer(np.diff(row_edges), np.diff(col_edges))
+
+
+def _block_edges(length, max_blocks):
+    """Boundaries of (nearly) equal-sized blocks, not exceeding max_blocks in number."""
+
+    max_blocks = max(1, int(max_blocks))
+    if length <= max_blocks:
+        return np.arange(length + 1)
+
+    return np.unique(np.linspace(0, length, max_blocks + 1).astype('intp'))
+
+
+def _isnull_blocks(data, block_size):
+    """Yields the boolean missingness indicator of the data, a block of rows at a time."""
+
+    for start in range(0, data.shape[0], block_size):
+        if isinstance(data, pd.DataFrame):
+            yield data.iloc[start:start+block_size].isnull().values
+        else:
+            yield pd.isnull(data[start:start+block_size])
+
+
+def _num_bytes(num_cols):
+
+    return (int(num_cols) + 7) // 8
+
+
+def _check_index(idx, length):
+    """Returns an integer index array, or None to select everything along that axis."""
+
+    if idx is None:
+        return None
+
+    idx = np.asarray(idx)
+    if idx.dtype == bool:
+        if idx.size != length:
+            raise ValueError('Boolean index must have {} elements'.format(length))
+        idx = np.flatnonzero(idx)
+    elif idx.size > 0 and not np.issubdtype(idx.dtype, np.integer):
+        raise TypeError('Index must be an array of integers or booleans!')
+
+    return idx.astype('intp', copy=False).ravel()
+
+
+def _rows_per_block(num_cols, bytes_per_cell=1):
+    """Number of rows to process at a time, to stay within the chunk memory budget."""
+
+    return max(1, int(cfg.CHUNK_SIZE_BYTES // max(1, num_cols * bytes_per_cell)))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+"""
+Orderings (seriation) of variables and subjects, placing those with similar
+missingness next to each other in the visualizations.
+
+"""
+
+import numpy as np
+from scipy.cluster.hierarchy import leaves_list, linkage
+from scipy.linalg import eigh
+from scipy.spatial.distance import squareform
+
+from missingdata.mask import MissingnessMask, _check_index
+from missingdata.pairwise import nullity_correlation
+from missingdata.patterns import missingness_patterns
+
+
+def cluster_order(data,
+                  row_idx=None,
+                  col_idx=None,
+                  axis='variables',
+                  method='average'):
+    """Order from hierarchical clustering of the nullity correlation.
+
+    Distances (1 - phi) are derived from the precomputed co-missing counts, so the
+    clustering works at thousands of variables. Clustering subjects needs a
+    (num_rows x num_rows) matrix, so it suits only a moderate number of them.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray or MissingnessMask
+        of shape (num_rows, num_cols)
+
+    row_idx, col_idx : ndarray of int or None
+        Rows and columns of the mask to include. Default: all of them.
+
+    axis : str
+        'variables' to order the columns, or 'subjects' to order the rows
+
+    method : str
+        Linkage method, one of those in scipy.cluster.hierarchy.linkage
+        Default: 'average'
+
+    Returns
+    -------
+    order : ndarray of int
+        Positions (within col_idx or row_idx, if given) in the clustered order
+
+    """
+
+    phi = nullity_correlation(data, row_idx, col_idx, axis=axis)
+    num_items = phi.shape[0]
+    if num_items < 3:
+        return np.arange(num_items)
+
+    # those always or never missing are uncorrelated with everything else
+    distance = 1.0 - np.nan_to_num(phi, nan=0.0)
+    np.fill_diagonal(distance, 0.0)
+    distance = np.clip((distance + distance.T) / 2, 0.0, 2.0)
+
+    links = linkage(squareform(distance, checks=False), method=method)
+
+    return leaves_list(links)
+
+
+def pattern_order(data, row_idx=None, col_idx=None):
+    """Approximate seriation of rows, sorting them by their pattern of missingness.
+
+    Rows are sorted by the number of variables missing (most first), and then by
+    their pattern, in lexicographic order of variables missing, so identical and
+    similar patterns end up in contiguous stripes. It needs only a pass to pack
+    and sort the patterns, so it scales to millions of rows.
+
+    Returns
+    -------
+    order : ndarray of int
+        Positions of the rows (within row_idx, if given) in the seriated order
+
+    """
+
+    patterns, _, pattern_index = missingness_patterns(data, row_idx, col_idx)
+
+    # lexicographic rank of patterns, the first variable being the primary key
+    lex_rank = np.empty(len(patterns), dtype='intp')
+    lex_rank[np.lexsort(~patterns.T[::-1])] = np.arange(len(patterns))
+    num_missing = patterns.sum(axis=1)
+
+    return np.lexsort((lex_rank[pattern_index], -num_missing[pattern_index]))
+
+
+def spectral_order(data, row_idx=None, col_idx=None, sample_size=10000, seed=0):
+    """Approximate seriation of rows, along the leading spectral axis of missingness.
+
+    The leading eigenvector of the covariance of the missingness indicators is
+    estimated from a random sample of rows (a sketch of at most sample_size rows),
+    and all the rows are sorted by their projection onto it, one block of rows at
+    a time. The cost is linear in the number of rows.
+
+    Returns
+    -------
+    order : ndarray of int
+        Positions of the rows (within row_idx, if given) in the seriated order
+
+    """
+
+    mask = MissingnessMask.from_data(data)
+    row_idx = _check_index(row_idx, mask.num_rows)
+    col_idx = _check_index(col_idx, mask.num_cols)
+    num_rows = mask.num_rows if row_idx is None else len(row_idx)
+    num_cols = mask.num_cols if col_idx is None else len(col_idx)
+    if num_rows < 2 or num_cols < 2:
+        return np.arange(num_rows)
+
+    all_rows = np.arange(mask.num_rows) if row_idx is None else row_idx
+    if num_rows > sample_size:
+        rng = np.random.RandomState(seed)
+        sample = np.sort(rng.choice(all_rows, sample_size, replace=False))
+    else:
+        sample = all_rows
+    sketch = mask.to_array(sample, col_idx).astype('float64')
+    center = sketch.mean(axis=0)
+    sketch -= center
+    _, axis = eigh(sketch.T @ sketch, subset_by_index=[num_cols - 1, num_cols - 1])
+    axis = axis.ravel()
+
+    scores = np.empty(num_rows)
+    for start, block in mask.iter_row_blocks(row_idx, col_idx):
+        scores[start:start + block.shape[0]] = (block - center) @ axis
+
+    return np.argsort(scores, kind='stable')
+
+
+def order_by(mask, row_idx, col_idx, axis, how):
+    """Order of the selected rows (or columns), as specified for blackholes."""
+
+    if how == 'cluster':
+        return cluster_order(mask, row_idx, col_idx, axis=axis)
+
+    if axis == 'subjects':
+        if how == 'pattern':
+            return pattern_order(mask, row_idx, col_idx)
+        if how == 'spectral':
+            return spectral_order(mask, row_idx, col_idx)
+        choices = "'cluster', 'pattern' or 'spectral'"
+    else:
+        choices = "'cluster'"
+
+    raise ValueError("Unrecognized ordering {} for {}: choose {}"
+                     "".format(how, axis, choices))
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pairwise relations in missingness, between variables or between subjects,
+computed from matrix products of the missingness mask.
+
+"""
+
+import numpy as np
+
+from missingdata import config as cfg
+from missingdata.mask import MissingnessMask, _POPCOUNT, _check_index, \
+    _rows_per_block
+
+
+def co_missing_counts(data,
+                      row_idx=None,
+                      col_idx=None,
+                      axis='variables',
+                      method='matmul'):
+    """Number of samples (or variables) missing together, for each pair.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray or MissingnessMask
+        of shape (num_rows, num_cols)
+
+    row_idx, col_idx : ndarray of int or None
+        Rows and columns of the mask to include. Default: all of them.
+
+    axis : str
+        'variables' to count the samples where each pair of variables is missing
+        together (num_cols x num_cols), or 'subjects' to count the variables missing
+        together in each pair of samples (num_rows x num_rows)
+
+    method : str
+        'matmul' to compute all the counts with a single matrix product of the
+        float32 mask (``M.T @ M`` or ``M @ M.T``), accumulated over blocks of rows.
+        'popcount' to pack each variable (or sample) into bits, eight cells per
+        byte, and count the bits set in the bitwise AND of each pair.
+
+    Returns
+    -------
+    counts : ndarray of int64
+        Symmetric matrix of co-missing counts, with the number of missing cells
+        of each variable (or sample) on the diagonal.
+
+    """
+
+    if axis not in ('variables', 'subjects'):
+        raise ValueError("axis must be either 'variables' or 'subjects'")
+    if method not in ('matmul', 'popcount'):
+        raise ValueError("method must be either 'matmul' or 'popcount'")
+
+    mask = MissingnessMask.from_data(data)
+    row_idx = _check_index(row_idx, mask.num_rows)
+    col_idx = _check_index(col_idx, mask.num_cols)
+
+    if method == 'popcount':
+        if axis == 'variables':
+            bits = _pack_columns(mask, row_idx, col_idx)
+        else:
+            bits = mask.take(row_idx, col_idx).pack().packed
+        return _popcount_gram(bits)
+
+    if axis == 'variables':
+        num_cols = mask.num_cols if col_idx is None else len(col_idx)
+        counts = np.zeros((num_cols, num_cols), dtype='float64')
+        for _, block in mask.iter_row_blocks(row_idx, col_idx):
+            block = block.astype('float32')
+            counts += block.T @ block
+    else:
+        flags = mask.to_array(row_idx, col_idx).astype('float32')
+        counts = flags @ flags.T
+
+    return np.rint(counts).astype('int64')
+
+
+def nullity_correlation(data,
+                        row_idx=None,
+                        col_idx=None,
+                        axis='variables'):
+    """Correlation (phi coefficient) of the missingness indicators, for each pair.
+
+    It is computed from the co-missing counts (a single product of the mask) and
+    the number missing in each variable (or subject), without any pairwise loops.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray or MissingnessMask
+        of shape (num_rows, num_cols)
+
+    row_idx, col_idx : ndarray of int or None
+        Rows and columns of the mask to include. Default: all of them.
+
+    axis : str
+        'variables' for correlations between variables (num_cols x num_cols),
+        or 'subjects' for those between samples (num_rows x num_rows)
+
+    Returns
+    -------
+    phi : ndarray of float64
+        Symmetric matrix of correlations in [-1, 1], NaN for the variables (or
+        subjects) always or never missing.
+
+    """
+
+    mask = MissingnessMask.from_data(data)
+    co_missing = co_missing_counts(mask, row_idx, col_idx, axis=axis)
+    row_idx = _check_index(row_idx, mask.num_rows)
+    col_idx = _check_index(col_idx, mask.num_cols)
+    if axis == 'variables':
+        num_total = mask.num_rows if row_idx is None else len(row_idx)
+    else:
+        num_total = mask.num_cols if col_idx is None else len(col_idx)
+
+    num_missing = np.diag(co_missing).astype('float64')
+    num_present = num_total - num_missing
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = (num_total * co_missing - np.outer(num_missing, num_missing)) / \
+              np.sqrt(np.outer(num_missing * num_present, num_missing * num_present))
+
+    constant = (num_missing == 0) | (num_present == 0)
+    phi[constant, :] = np.nan
+    phi[:, constant] = np.nan
+
+    return np.clip(phi, -1.0, 1.0)
+
+
+def co_missing_blocked(data,
+                       out_path,
+                       row_idx=None,
+                       col_idx=None,
+                       block_size=None):
+    """Subject-by-subject co-missing counts, computed in tiles into a file on disk.
+
+    Tiles of rows are multiplied with each other (``M_i @ M_j.T`` in float32), and
+    each tile of counts is written to (and mirrored in) a memory-mapped .npy file,
+    so only a pair of tiles needs to be in memory at a time, irrespective of the
+    number of subjects.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray or MissingnessMask
+        of shape (num_rows, num_cols)
+
+    out_path : str
+        Path to the .npy file to create, for the (num_rows x num_rows) counts
+
+    row_idx, col_idx : ndarray of int or None
+        Rows and columns of the mask to include. Default: all of them.
+
+    block_size : int or None
+        Number of rows in each tile.
+        Default: None, chosen within the memory budget in missingdata.config
+
+    Returns
+    -------
+    counts : numpy.memmap
+        Symmetric matrix of co-missing counts, backed by the file at out_path.
+        It can be reopened later with ``np.load(out_path, mmap_mode='r')``
+
+    """
+
+    mask = MissingnessMask.from_data(data)
+    row_idx = _check_index(row_idx, mask.num_rows)
+    col_idx = _check_index(col_idx, mask.num_cols)
+    if row_idx is None:
+        row_idx = np.arange(mask.num_rows)
+    num_rows = len(row_idx)
+    num_cols = mask.num_cols if col_idx is None else len(col_idx)
+
+    block_size = _tile_size(num_cols, block_size)
+    # counts never exceed the number of variables
+    dtype = np.min_scalar_type(max(num_cols, 1))
+    counts = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype,
+                                       shape=(num_rows, num_rows))
+
+    for start in range(0, num_rows, block_size):
+        stop = min(start + block_size, num_rows)
+        tile = mask.to_array(row_idx[start:stop], col_idx).astype('float32')
+        for other_start in range(start, num_rows, block_size):
+            other_stop = min(other_start + block_size, num_rows)
+            if other_start == start:
+                other = tile
+            else:
+                other = mask.to_array(row_idx[other_start:other_stop],
+                                      col_idx).astype('float32')
+            common = np.rint(tile @ other.T).astype(dtype)
+            counts[start:stop, other_start:other_stop] = common
+            if other_start != start:
+                counts[other_start:other_stop, start:stop] = common.T
+
+    counts.flush()
+
+    return counts
+
+
+def co_missing_nearest(data,
+                       num_nearest,
+                       row_idx=None,
+                       col_idx=None,
+                       similarity='jaccard',
+                       block_size=None):
+    """The most similar subjects to each subject, in terms of their missingness.
+
+    Similarities are computed in tiles of rows (as products of the float32 mask),
+    keeping only a running top-k for each subject. Memory is thus bounded by the
+    tile size and k, and never grows with the square of the number of subjects.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray or MissingnessMask
+        of shape (num_rows, num_cols)
+
+    num_nearest : int
+        Number of most similar subjects (k) to find for each subject
+
+    row_idx, col_idx : ndarray of int or None
+        Rows and columns of the mask to include. Default: all of them.
+
+    similarity : str
+        'jaccard' for the number of variables missing together divided by the
+        number of variables missing in either subject, or 'count' for the
+        number of variables missing together.
+        Default: 'jaccard'
+
+    block_size : int or None
+        Number of rows in each tile.
+        Default: None, chosen within the memory budget in missingdata.config
+
+    Returns
+    -------
+    nearest : ndarray of int
+        of shape (num_rows, k), positions (within row_idx, if given) of the most
+        similar subjects for each subject, excluding itself, in decreasing order of
+        similarity
+
+    scores : ndarray of float32
+        of shape (num_rows, k), their similarities
+
+    """
+
+    if similarity not in ('jaccard', 'count'):
+        raise ValueError("similarity must be either 'jaccard' or 'count'")
+
+    mask = MissingnessMask.from_data(data)
+    row_idx = _check_index(row_idx, mask.num_rows)
+    col_idx = _check_index(col_idx, mask.num_cols)
+    if row_idx is None:
+        row_idx = np.arange(mask.num_rows)
+    num_rows = len(row_idx)
+    num_cols = mask.num_cols if col_idx is None else len(col_idx)
+
+    num_nearest = int(num_nearest)
+    if not (0 < num_nearest < num_rows):
+        raise ValueError('Number of nearest subjects must be between 1 and {}'
+                         ''.format(num_rows - 1))
+
+    block_size = _tile_size(num_cols, block_size)
+    row_counts = mask.counts(row_idx, col_idx)[0].astype('float32')
+
+    nearest = np.zeros((num_rows, num_nearest), dtype='int64')
+    scores = np.zeros((num_rows, num_nearest), dtype='float32')
+    for start in range(0, num_rows, block_size):
+        stop = min(start + block_size, num_rows)
+        tile = mask.to_array(row_idx[start:stop], col_idx).astype('float32')
+        best_idx = np.zeros((stop - start, 0), dtype='int64')
+        best_scores = np.zeros((stop - start, 0), dtype='float32')
+        for other_start in range(0, num_rows, block_size):
+            other_stop = min(other_start + block_size, num_rows)
+            other = mask.to_array(row_idx[other_start:other_stop],
+                                  col_idx).astype('float32')
+            tile_scores = tile @ other.T
+            if similarity == 'jaccard':
+                union = row_counts[start:stop, np.newaxis] \
+                        + row_counts[np.newaxis, other_start:other_stop] - tile_scores
+                tile_scores = np.divide(tile_scores, union,
+                                        out=np.zeros_like(tile_scores),
+                                        where=union > 0)
+            # excluding each subject from its own neighbours
+            self_pos = np.arange(max(start, other_start), min(stop, other_stop))
+            tile_scores[self_pos - start, self_pos - other_start] = -np.inf
+
+            tile_idx = np.broadcast_to(np.arange(other_start, other_stop),
+                                       tile_scores.shape)
+            best_idx, best_scores = _merge_top_k(np.hstack((best_idx, tile_idx)),
+                                                 np.hstack((best_scores, tile_scores)),
+                                                 num_nearest)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        nearest[start:stop] = np.take_along_axis(best_idx, order, axis=1)
+        scores[start:stop] = np.take_along_axis(best_scores, order, axis=1)
+
+    return nearest, scores
+
+
+def _merge_top_k(candidates, candidate_scores, num_nearest):
+    """Keeps the k highest scoring candidates in each row, via partial selection."""
+
+    if candidate_scores.shape[1] <= num_nearest:
+        return candidates, candidate_scores
+
+    split = candidate_scores.shape[1] - num_nearest
+    top = np.argpartition(candidate_scores, split, axis=1)[:, split:]
+
+    return np.take_along_axis(candidates, top, axis=1), \
+           np.take_along_axis(candidate_scores, top, axis=1)
+
+
+def _tile_size(num_cols, block_size=None):
+    """Number of rows in a tile, so a pair of tiles and their product fit the budget."""
+
+    if block_size is not None:
+        if int(block_size) < 1:
+            raise ValueError('block_size must be a positive number of rows!')
+        return int(block_size)
+
+    # float32 tiles of (size x num_cols), and their (size x size) product
+    by_product = int(np.sqrt(cfg.CHUNK_SIZE_BYTES / 4))
+    by_tiles = _rows_per_block(num_cols, bytes_per_cell=8)
+
+    return max(1, min(by_product, by_tiles))
+
+
+def _pack_columns(mask, row_idx, col_idx):
+    """Packs each selected column of the mask into bits, along the rows."""
+
+    num_rows = mask.num_rows if row_idx is None else len(row_idx)
+    num_cols = mask.num_cols if col_idx is None else len(col_idx)
+
+    # blocks of rows must be a multiple of 8, to fill in whole bytes
+    block_size = 8 * max(1, _rows_per_block(num_cols) // 8)
+    bits = np.zeros((num_cols, (num_rows + 7) // 8), dtype='uint8')
+    for start, block in mask.iter_row_blocks(row_idx, col_idx, block_size):
+        packed = np.packbits(block.T, axis=1)
+        bits[:, start // 8:start // 8 + packed.shape[1]] = packed
+
+    return bits
+
+
+def _popcount_gram(bits):
+    """Gram matrix of bit vectors (one per row), via popcounts of their bitwise AND."""
+
+    num_items = bits.shape[0]
+    counts = np.zeros((num_items, num_items), dtype='int64')
+    for item in range(num_items):
+        common = _POPCOUNT[bits[item] & bits[item:]].sum(axis=1, dtype='int64')
+        counts[item, item:] = common
+        counts[item:, item] = common
+
+    return counts
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+Distinct patterns of missingness (combinations of variables missing together),
+shared by the pattern-level statistics and imputation.
+
+"""
+
+import numpy as np
+
+from missingdata.mask import MissingnessMask
+
+
+def missingness_patterns(data, row_idx=None, col_idx=None):
+    """Distinct patterns of missingness across variables, and how often they occur.
+
+    Each row of the mask is packed into bits (eight variables per byte), and the
+    packed rows are compared as compact keys (via np.unique on a void view of the
+    bytes), instead of comparing the full boolean rows.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray or MissingnessMask
+        of shape (num_rows, num_cols)
+
+    row_idx, col_idx : ndarray of int or None
+        Rows and columns of the mask to include. Default: all of them.
+
+    Returns
+    -------
+    patterns : ndarray of bool
+        of shape (num_patterns, num_cols), True where variables are missing in each
+        pattern, in decreasing order of their frequency
+
+    counts : ndarray of int
+        of shape (num_patterns, ), number of rows with each pattern
+
+    pattern_index : ndarray of int
+        of shape (num_rows, ), the pattern of each row, as a row of ``patterns``
+
+    """
+
+    mask = MissingnessMask.from_data(data).take(row_idx, col_idx)
+    num_rows, num_cols = mask.shape
+    if num_cols < 1:
+        raise ValueError('At least one variable is needed to find patterns!')
+
+    packed = np.ascontiguousarray(mask.pack().packed)
+    keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+    _, first_row, inverse, counts = np.unique(keys, return_index=True,
+                                              return_inverse=True,
+                                              return_counts=True)
+
+    # most frequent patterns first
+    order = np.argsort(-counts, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    patterns = np.unpackbits(packed[first_row[order]], axis=1,
+                             count=num_cols).view(bool)
+
+    return patterns, counts[order], rank[inverse.ravel()]
+
+
+def rows_by_pattern(pattern_index, num_patterns=None):
+    """Groups rows by their pattern, with a single (stable) sort.
+
+    Returns
+    -------
+    row_order : ndarray of int
+        Rows sorted by their pattern, so rows of pattern p are
+        ``row_order[boundaries[p]:boundaries[p+1]]``
+
+    boundaries : ndarray of int
+        of shape (num_patterns+1, )
+
+    """
+
+    pattern_index = np.asarray(pattern_index)
+    if num_patterns is None:
+        num_patterns = pattern_index.max() + 1 if pattern_index.size > 0 else 0
+
+    row_order = np.argsort(pattern_index, kind='stable')
+    boundaries = np.r_[0, np.cumsum(np.bincount(pattern_index,
+                                                minlength=num_patterns))]
+
+    return row_order, boundaries
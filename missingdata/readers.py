@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+"""
+Readers building the missingness mask directly from files on disk, without
+parsing the values themselves.
+
+"""
+
+import csv
+from io import StringIO
+
+import numpy as np
+
+from missingdata import config as cfg
+from missingdata.mask import MissingnessMask, PackedMissingnessMask
+
+
+def read_csv_mask(path,
+                  label_col=None,
+                  delimiter=',',
+                  na_values=None,
+                  packed=False,
+                  chunk_size=None):
+    """Scans a CSV file in chunks, and returns the mask of its empty or NA fields.
+
+    Only the positions of delimiters and line breaks are located (in a vectorized
+    manner over each chunk of bytes), to find out which fields are empty or match
+    one of the NA tokens. Values are never parsed into numbers or strings, except
+    for the label column, if requested. Memory usage is bounded by the chunk size,
+    besides the resulting mask.
+
+    Fields are expected not to contain line breaks, even when quoted. Chunks
+    containing quotes are handled with the slower ``csv`` module.
+
+    Parameters
+    ----------
+    path : str
+        Path to the CSV file, with a header line naming the columns
+
+    label_col : str or int or None
+        Name (or position) of the column to label rows with. This column is excluded
+        from the mask. Default: None, no labels for rows.
+
+    delimiter : str
+        Single character separating the fields in each line. Default: ','
+
+    na_values : iterable of str or None
+        Tokens (other than an empty field) indicating missing data.
+        Default: None, using the same tokens as pandas (NA, NaN, null etc)
+
+    packed : bool
+        Flag to return a bit-packed mask (eight cells per byte). Default: False
+
+    chunk_size : int or None
+        Number of bytes to read from the file at a time.
+        Default: None, using the memory budget in missingdata.config
+
+    Returns
+    -------
+    mask : MissingnessMask or PackedMissingnessMask
+        of shape (num_rows, num_cols), excluding the header and the label column
+
+    col_labels : ndarray of str
+        Names of the columns in the mask, from the header
+
+    row_labels : ndarray of str or None
+        Values in the label column, if label_col was specified
+
+    """
+
+    if len(delimiter) != 1:
+        raise ValueError('delimiter must be a single character!')
+
+    if na_values is None:
+        na_values = cfg.NA_TOKENS
+    na_tokens = [str(token).encode() for token in na_values if len(str(token)) > 0]
+
+    if chunk_size is None:
+        chunk_size = cfg.CHUNK_SIZE_BYTES
+    chunk_size = int(chunk_size)
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be a positive number of bytes!')
+
+    with open(path, 'rb') as csv_file:
+        header = csv_file.readline().decode().rstrip('\r\n')
+        col_names = next(csv.reader([header], delimiter=delimiter))
+        num_fields = len(col_names)
+
+        label_pos = _label_position(label_col, col_names)
+        keep_cols = np.array([pos != label_pos for pos in range(num_fields)])
+
+        mask_chunks, label_chunks = list(), list()
+        remainder = b''
+        line_num = 2  # 1-based, after the header
+        while True:
+            chunk = csv_file.read(chunk_size)
+            if len(chunk) < 1:
+                if len(remainder) > 0:
+                    chunk, remainder = remainder + b'\n', b''
+                else:
+                    break
+            else:
+                chunk = remainder + chunk
+                last_break = chunk.rfind(b'\n')
+                if last_break < 0:
+                    remainder = chunk
+                    continue
+                chunk, remainder = chunk[:last_break + 1], chunk[last_break + 1:]
+
+            cell_flag, labels, num_lines = _scan_chunk(chunk, num_fields, delimiter,
+                                                       na_tokens, label_pos,
+                                                       line_num)
+            line_num += num_lines
+            cell_flag = cell_flag[:, keep_cols]
+            if packed:
+                mask_chunks.append(np.packbits(cell_flag, axis=1))
+            else:
+                mask_chunks.append(cell_flag)
+            if labels is not None:
+                label_chunks.append(labels)
+
+    num_cols = int(keep_cols.sum())
+    if packed:
+        stacked = np.concatenate(mask_chunks, axis=0) if mask_chunks else \
+            np.zeros((0, (num_cols + 7) // 8), dtype='uint8')
+        mask = PackedMissingnessMask(stacked, num_cols)
+    else:
+        stacked = np.concatenate(mask_chunks, axis=0) if mask_chunks else \
+            np.zeros((0, num_cols), dtype=bool)
+        mask = MissingnessMask(stacked)
+
+    col_labels = np.array(col_names, dtype='str')[keep_cols]
+    if label_pos is not None:
+        row_labels = np.concatenate(label_chunks) if label_chunks else \
+            np.array([], dtype='str')
+    else:
+        row_labels = None
+
+    return mask, col_labels, row_labels
+
+
+def _label_position(label_col, col_names):
+    """Position of the label column in the header, or None."""
+
+    if label_col is None:
+        return None
+
+    if isinstance(label_col, str):
+        if label_col not in col_names:
+            raise ValueError('Column {} does not exist in the header!'.format(label_col))
+        return col_names.index(label_col)
+
+    if not isinstance(label_col, (int, np.integer)) or \
+            not (0 <= label_col < len(col_names)):
+        raise ValueError('label_col must be a column name or an int between '
+                         '0 and {}'.format(len(col_names) - 1))
+
+    return int(label_col)
+
+
+def _scan_chunk(chunk, num_fields, delimiter, na_tokens, label_pos, first_line):
+    """Missingness of the fields in a chunk of complete lines, without parsing them."""
+
+    if b'"' in chunk:
+        return _scan_chunk_quoted(chunk, num_fields, delimiter, na_tokens, label_pos,
+                                  first_line)
+
+    buffer = np.frombuffer(chunk, dtype='uint8')
+    is_line_break = buffer == ord('\n')
+    sep_pos = np.flatnonzero(is_line_break | (buffer == ord(delimiter)))
+
+    # fields span from the previous separator to the next one
+    starts = np.r_[0, sep_pos[:-1] + 1]
+    lengths = sep_pos - starts
+    ends_line = is_line_break[sep_pos]
+    # ignoring carriage returns at the end of lines
+    with_cr = ends_line & (lengths > 0)
+    with_cr[with_cr] = buffer[sep_pos[with_cr] - 1] == ord('\r')
+    lengths[with_cr] -= 1
+
+    last_fields = np.flatnonzero(ends_line)
+    fields_per_line = np.diff(np.r_[-1, last_fields])
+    blank_lines = (fields_per_line == 1) & (lengths[last_fields] == 0)
+    invalid = (fields_per_line != num_fields) & ~blank_lines
+    if invalid.any():
+        bad_line = np.flatnonzero(invalid)[0]
+        raise ValueError('Expected {} fields in line {}, found {}'
+                         ''.format(num_fields, first_line + bad_line,
+                                   fields_per_line[bad_line]))
+
+    if blank_lines.any():
+        keep_fields = np.repeat(~blank_lines, fields_per_line)
+        starts, lengths = starts[keep_fields], lengths[keep_fields]
+
+    missing = lengths == 0
+    for token in na_tokens:
+        candidates = np.flatnonzero(lengths == len(token))
+        if candidates.size < 1:
+            continue
+        token_bytes = np.frombuffer(token, dtype='uint8')
+        window = buffer[starts[candidates, np.newaxis] + np.arange(len(token))]
+        matches = (window == token_bytes).all(axis=1)
+        missing[candidates[matches]] = True
+
+    cell_flag = missing.reshape(-1, num_fields)
+
+    if label_pos is not None:
+        label_starts = starts[label_pos::num_fields]
+        label_lengths = lengths[label_pos::num_fields]
+        labels = np.array([chunk[st:st + ln].decode()
+                           for st, ln in zip(label_starts, label_lengths)], dtype='str')
+    else:
+        labels = None
+
+    return cell_flag, labels, len(last_fields)
+
+
+def _scan_chunk_quoted(chunk, num_fields, delimiter, na_tokens, label_pos,
+                       first_line):
+    """Slower path for chunks with quoted fields, relying on the csv module."""
+
+    lines = chunk.decode().splitlines()
+    na_strings = set(token.decode() for token in na_tokens)
+    na_strings.add('')
+
+    missing, labels = list(), list()
+    for num, fields in enumerate(csv.reader(StringIO('\n'.join(lines)),
+                                            delimiter=delimiter)):
+        if len(fields) < 1 or (len(fields) == 1 and fields[0] == ''):
+            continue
+        if len(fields) != num_fields:
+            raise ValueError('Expected {} fields in line {}, found {}'
+                             ''.format(num_fields, first_line + num, len(fields)))
+        missing.append([field in na_strings for field in fields])
+        if label_pos is not None:
+            labels.append(fields[label_pos])
+
+    cell_flag = np.array(missing, dtype=bool).reshape(-1, num_fields)
+    labels = np.array(labels, dtype='str') if label_pos is not None else None
+
+    return cell_flag, labels, len(lines)
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+
+"""
+Statistical characterization of the type of missingness, e.g. whether the data
+is missing completely at random (MCAR).
+
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from missingdata.mask import MissingnessMask, _rows_per_block
+from missingdata.patterns import missingness_patterns, rows_by_pattern
+
+
+def little_mcar_test(data, max_iter=200, tol=1e-6):
+    """Little's test of the hypothesis that data is missing completely at random.
+
+    Rows are grouped by their pattern of missingness, and the mean of the observed
+    variables within each pattern is compared to the maximum likelihood estimate
+    of the mean (from EM, under a multivariate normal model), weighting by the
+    inverse of the corresponding block of the estimated covariance. All the
+    computations are batched per pattern, never per row.
+
+    Little, R. J. A. (1988). A test of missing completely at random for
+    multivariate data with missing values. JASA, 83(404), 1198-1202.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray
+        of shape (num_rows, num_cols), with numeric values and NaNs where missing.
+        Rows with all the values missing are ignored.
+
+    max_iter : int
+        Maximum number of EM iterations to estimate the mean and covariance.
+        Default: 200
+
+    tol : float
+        EM stops when the largest change in the mean and covariance falls below this.
+        Default: 1e-6
+
+    Returns
+    -------
+    statistic : float
+        Little's chi-square statistic (d^2)
+
+    dof : int
+        Degrees of freedom: total number of observed variables over all patterns,
+        minus the number of variables
+
+    p_value : float
+        Probability of a statistic at least this large, if data were MCAR. Small
+        values are evidence against MCAR.
+
+    """
+
+    values = _numeric_values(data)
+    cell_flag = np.isnan(values)
+    if cell_flag.all(axis=0).any():
+        raise ValueError('Some variables have no observed values!')
+    values = values[~cell_flag.all(axis=1)]
+    cell_flag = cell_flag[~cell_flag.all(axis=1)]
+    if values.shape[0] < 2:
+        raise ValueError('At least two rows with observed values are needed!')
+
+    pattern_stats = _pattern_sufficient_stats(values, cell_flag)
+    mean, cov, _, _ = _em_mvn(pattern_stats, *_initial_estimates(values),
+                              max_iter=max_iter, tol=tol)
+
+    patterns, counts, sums, _ = pattern_stats
+    statistic, dof = 0.0, -values.shape[1]
+    for missing, count, obs_sum in zip(patterns, counts, sums):
+        observed = ~missing
+        diff = obs_sum / count - mean[observed]
+        statistic += count * diff @ _solve(cov[np.ix_(observed, observed)], diff)
+        dof += observed.sum()
+
+    p_value = stats.chi2.sf(statistic, dof) if dof > 0 else np.nan
+
+    return float(statistic), int(dof), float(p_value)
+
+
+def em_mvn(data, mean=None, cov=None, max_iter=200, tol=1e-6):
+    """Maximum likelihood estimates of the mean and covariance, with missing values.
+
+    Estimates come from EM under a multivariate normal model. Rows are grouped by
+    their pattern of missingness once, and the sums and cross-products of their
+    observed values are accumulated per pattern. Each iteration then updates the
+    expected sufficient statistics with one linear solve per pattern, so it costs
+    O(num_patterns x num_cols^3), regardless of the number of rows.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray
+        of shape (num_rows, num_cols), with numeric values and NaNs where missing.
+        Rows with all the values missing are ignored.
+
+    mean : ndarray or None
+        of shape (num_cols, ), to start EM from e.g. the estimates from a previous
+        fit (warm start). Default: None, starting from the means of observed values.
+
+    cov : ndarray or None
+        of shape (num_cols, num_cols), to start EM from, along with mean.
+        Default: None, starting from the variances of observed values.
+
+    max_iter : int
+        Maximum number of EM iterations. Default: 200
+
+    tol : float
+        EM stops when the largest change in the mean and covariance falls below this.
+        Default: 1e-6
+
+    Returns
+    -------
+    mean : ndarray
+        of shape (num_cols, ), estimated mean
+
+    cov : ndarray
+        of shape (num_cols, num_cols), estimated covariance
+
+    num_iter : int
+        Number of EM iterations run
+
+    converged : bool
+        Whether EM stopped before max_iter, due to tol
+
+    """
+
+    if int(max_iter) < 1:
+        raise ValueError('max_iter must be at least 1')
+
+    values = _numeric_values(data)
+    cell_flag = np.isnan(values)
+    if cell_flag.all(axis=0).any():
+        raise ValueError('Some variables have no observed values!')
+    with_obs = ~cell_flag.all(axis=1)
+    if with_obs.sum() < 2:
+        raise ValueError('At least two rows with observed values are needed!')
+    values, cell_flag = values[with_obs], cell_flag[with_obs]
+
+    init_mean, init_cov = _initial_estimates(values)
+    num_cols = values.shape[1]
+    if mean is not None:
+        init_mean = np.asarray(mean, dtype='float64')
+        if init_mean.shape != (num_cols,):
+            raise ValueError('mean must be of shape ({}, )'.format(num_cols))
+    if cov is not None:
+        init_cov = np.asarray(cov, dtype='float64')
+        if init_cov.shape != (num_cols, num_cols):
+            raise ValueError('cov must be of shape ({0}, {0})'.format(num_cols))
+
+    pattern_stats = _pattern_sufficient_stats(values, cell_flag)
+
+    return _em_mvn(pattern_stats, init_mean, init_cov, max_iter=max_iter, tol=tol)
+
+
+def mar_screen(data):
+    """Screens for association between missingness in each variable and all others.
+
+    For each pair of variables (i, j), the values of variable j are compared
+    between samples where variable i is missing and those where it is observed,
+    with Welch's t-test. All the V x V tests are computed together: the group
+    counts, sums and sums of squares come from matrix products of the mask with
+    the (centered and zero-filled) data and its square, accumulated over blocks
+    of rows. Significant associations are evidence against MCAR, and point to the
+    variables the missingness depends on (MAR).
+
+    Parameters
+    ----------
+    data : pandas DataFrame or ndarray
+        of shape (num_rows, num_cols), with numeric values and NaNs where missing.
+
+    Returns
+    -------
+    statistic : ndarray
+        of shape (num_cols, num_cols), Welch's t-statistic for the difference in
+        means of variable j (column) between samples with variable i (row) missing
+        and those with it observed. NaN where it can not be computed (e.g. fewer
+        than two samples in either group), including the diagonal.
+
+    p_value : ndarray
+        of shape (num_cols, num_cols), two-sided p-values of these statistics.
+
+    """
+
+    values = _numeric_values(data)
+    num_rows, num_cols = values.shape
+
+    # centering improves the precision of variances from sums of squares
+    center = np.zeros(num_cols)
+    has_obs = ~np.isnan(values).all(axis=0)
+    center[has_obs] = np.nanmean(values[:, has_obs], axis=0)
+
+    count_miss = np.zeros((num_cols, num_cols))
+    sum_miss = np.zeros((num_cols, num_cols))
+    sumsq_miss = np.zeros((num_cols, num_cols))
+    count_all, sum_all, sumsq_all = np.zeros(num_cols), np.zeros(num_cols), \
+                                    np.zeros(num_cols)
+
+    block_size = _rows_per_block(num_cols, bytes_per_cell=32)
+    for start in range(0, num_rows, block_size):
+        block = values[start:start + block_size] - center
+        missing = np.isnan(block)
+        filled = np.where(missing, 0.0, block)
+        flags, observed, squared = missing.astype('float64'), \
+                                   (~missing).astype('float64'), filled ** 2
+        # [i, j]: over samples with i missing, and j observed
+        count_miss += flags.T @ observed
+        sum_miss += flags.T @ filled
+        sumsq_miss += flags.T @ squared
+        count_all += observed.sum(axis=0)
+        sum_all += filled.sum(axis=0)
+        sumsq_all += squared.sum(axis=0)
+
+    count_obs = count_all - count_miss
+    sum_obs = sum_all - sum_miss
+    sumsq_obs = sumsq_all - sumsq_miss
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_miss, var_miss = _mean_var(count_miss, sum_miss, sumsq_miss)
+        mean_obs, var_obs = _mean_var(count_obs, sum_obs, sumsq_obs)
+        sq_err_miss, sq_err_obs = var_miss / count_miss, var_obs / count_obs
+        std_err = np.sqrt(sq_err_miss + sq_err_obs)
+        statistic = (mean_miss - mean_obs) / std_err
+        # Welch-Satterthwaite degrees of freedom
+        dof = (sq_err_miss + sq_err_obs) ** 2 / \
+              (sq_err_miss ** 2 / (count_miss - 1) + sq_err_obs ** 2 / (count_obs - 1))
+
+    invalid = (count_miss < 2) | (count_obs < 2) | ~(std_err > 0) | ~np.isfinite(dof)
+    np.fill_diagonal(invalid, True)
+    statistic[invalid] = np.nan
+    p_value = np.full_like(statistic, np.nan)
+    p_value[~invalid] = 2 * stats.t.sf(np.abs(statistic[~invalid]), dof[~invalid])
+
+    return statistic, p_value
+
+
+def _mean_var(count, total, total_sq):
+    """Means and unbiased variances from counts, sums and sums of squares."""
+
+    mean = total / count
+    variance = (total_sq - count * mean ** 2) / (count - 1)
+
+    return mean, np.maximum(variance, 0.0)
+
+
+def _numeric_values(data):
+    """Values of the data as a float64 array, with NaNs where missing."""
+
+    if isinstance(data, MissingnessMask):
+        raise TypeError('Values of the data are needed, not just its missingness!')
+
+    try:
+        if isinstance(data, pd.DataFrame):
+            values = data.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            values = np.array(data, dtype='float64')
+    except (TypeError, ValueError):
+        raise ValueError('Data must be numeric (convertible to float)!')
+
+    if values.ndim != 2:
+        raise ValueError('Input data must be 2D matrix!')
+
+    return values
+
+
+def _pattern_sufficient_stats(values, cell_flag):
+    """Number of rows, sums and cross-products of observed variables, per pattern.
+
+    Returns
+    -------
+    patterns : ndarray of bool
+        of shape (num_patterns, num_cols), True where variables are missing
+
+    counts : ndarray of int
+        number of rows in each pattern
+
+    sums : list of ndarray
+        Sum of the observed variables over the rows of each pattern
+
+    cross_prods : list of ndarray
+        Sum of the outer products of the observed variables in each pattern
+
+    """
+
+    patterns, counts, pattern_index = missingness_patterns(MissingnessMask(cell_flag))
+    row_order, boundaries = rows_by_pattern(pattern_index, len(patterns))
+
+    sums, cross_prods = list(), list()
+    for pp, missing in enumerate(patterns):
+        rows = row_order[boundaries[pp]:boundaries[pp + 1]]
+        observed = values[np.ix_(rows, ~missing)]
+        sums.append(observed.sum(axis=0))
+        cross_prods.append(observed.T @ observed)
+
+    return patterns, counts, sums, cross_prods
+
+
+def _initial_estimates(values):
+    """Starting point for EM: means and (diagonal) variances of the observed values."""
+
+    mean = np.nanmean(values, axis=0)
+    variance = np.nanvar(values, axis=0)
+    variance[~(variance > 0)] = 1.0
+
+    return mean, np.diag(variance)
+
+
+def _solve(cov, rhs):
+    """Solves a linear system with a covariance, or its least squares if singular."""
+
+    try:
+        return np.linalg.solve(cov, rhs)
+    except np.linalg.LinAlgError:
+        # singular covariance e.g. with collinear or constant variables
+        return np.linalg.lstsq(cov, rhs, rcond=None)[0]
+
+
+def _em_mvn(pattern_stats, mean, cov, max_iter=200, tol=1e-6):
+    """EM estimates of the mean and covariance of a multivariate normal distribution.
+
+    Each iteration computes the expected sufficient statistics from those of the
+    observed variables in each pattern, with one linear solve per pattern, so its
+    cost depends on the number of patterns, not the number of rows.
+    """
+
+    if int(max_iter) < 1:
+        raise ValueError('max_iter must be at least 1')
+
+    patterns, counts, sums, cross_prods = pattern_stats
+    num_rows, num_cols = counts.sum(), patterns.shape[1]
+
+    mean = np.array(mean, dtype='float64')
+    cov = np.array(cov, dtype='float64')
+    converged = False
+    for num_iter in range(1, max_iter + 1):
+        total = np.zeros(num_cols)
+        total_prods = np.zeros((num_cols, num_cols))
+        for missing, count, obs_sum, obs_prods in zip(patterns, counts, sums,
+                                                      cross_prods):
+            observed = ~missing
+            ix_oo = np.ix_(observed, observed)
+            total[observed] += obs_sum
+            total_prods[ix_oo] += obs_prods
+            if not missing.any():
+                continue
+
+            # conditional mean of missing given observed: offset + coef.T @ x_obs
+            ix_om, ix_mm = np.ix_(observed, missing), np.ix_(missing, missing)
+            coef = _solve(cov[ix_oo], cov[ix_om])
+            offset = mean[missing] - coef.T @ mean[observed]
+            cond_cov = cov[ix_mm] - cov[ix_om].T @ coef
+
+            pred_sum = count * offset + coef.T @ obs_sum
+            prods_om = np.outer(obs_sum, offset) + obs_prods @ coef
+            total[missing] += pred_sum
+            total_prods[ix_om] += prods_om
+            total_prods[np.ix_(missing, observed)] += prods_om.T
+            total_prods[ix_mm] += count * np.outer(offset, offset) \
+                                  + np.outer(offset, coef.T @ obs_sum) \
+                                  + np.outer(coef.T @ obs_sum, offset) \
+                                  + coef.T @ obs_prods @ coef \
+                                  + count * cond_cov
+
+        new_mean = total / num_rows
+        new_cov = total_prods / num_rows - np.outer(new_mean, new_mean)
+        change = max(np.abs(new_mean - mean).max(), np.abs(new_cov - cov).max())
+        mean, cov = new_mean, new_cov
+        if change < tol:
+            converged = True
+            break
+
+    return mean, cov, num_iter, converged
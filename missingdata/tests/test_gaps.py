@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the gaps in ordered data."""
+
+from os.path import dirname, join as pjoin, realpath
+
+import numpy as np
+import pandas as pd
+
+from missingdata.gaps import gap_length_histogram, missing_runs
+
+data_dir = pjoin(dirname(realpath(__file__)), '..', '..', 'datasets', 'OpenMV')
+
+
+def naive_runs(cell_flag):
+
+    runs = list()
+    for col in range(cell_flag.shape[1]):
+        start = None
+        for row, missing in enumerate(np.r_[cell_flag[:, col], False]):
+            if missing and start is None:
+                start = row
+            elif not missing and start is not None:
+                runs.append((start, row - start, col))
+                start = None
+
+    return runs
+
+
+def test_missing_runs():
+
+    df = pd.read_csv(pjoin(data_dir, 'kamyr-digester.csv'))
+    rng = np.random.RandomState(42)
+    flags = rng.rand(500, 7) < 0.3
+    flags[-5:, 2] = True
+    for data, cell_flag in ((df, df.isnull().values),
+                            (np.where(flags, np.nan, 0.0), flags)):
+        starts, lengths, cols = missing_runs(data)
+        assert list(zip(starts, lengths, cols)) == naive_runs(cell_flag)
+        assert lengths.sum() == cell_flag.sum()
+
+
+def test_gap_length_histogram():
+
+    lengths = np.array([1, 1, 2, 3, 4, 9, 1])
+    cols = np.array([0, 0, 0, 1, 1, 1, 3])
+    counts, bins = gap_length_histogram(lengths)
+    assert np.array_equal(bins, [1, 2, 4, 8, 16])
+    assert np.array_equal(counts, [3, 2, 1, 1])
+
+    counts, _ = gap_length_histogram(lengths, cols, num_cols=4)
+    assert counts.shape == (4, 4)
+    assert np.array_equal(counts[0], [2, 1, 0, 0])
+    assert np.array_equal(counts.sum(axis=0), [3, 2, 1, 1])
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the imputers."""
+
+import gc
+import weakref
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from missingdata import config as cfg
+from missingdata.gaps import missing_runs
+from missingdata.imputation import (HotDeckImputer, IterativeImputer, KNNImputer,
+                                    MultipleImputations, OrderedImputer,
+                                    RegressionImputer, SimpleImputer, SoftImputer,
+                                    rubins_rules)
+
+rng = np.random.RandomState(500)
+num_rows, num_cols = 400, 6
+chol = rng.randn(num_cols, num_cols)
+complete = rng.randn(num_rows, num_cols) @ chol + 10 * np.arange(num_cols)
+cell_flag = rng.rand(num_rows, num_cols) < 0.1
+incomplete = np.where(cell_flag, np.nan, complete)
+
+
+def test_simple_imputer():
+
+    for strategy, stat_func in (('mean', np.nanmean), ('median', np.nanmedian)):
+        imputed = SimpleImputer(strategy=strategy).fit_transform(incomplete)
+        stats = stat_func(incomplete, axis=0)
+        assert np.allclose(imputed[cell_flag], np.broadcast_to(stats, cell_flag.shape)
+                           [cell_flag])
+        assert np.array_equal(imputed[~cell_flag], complete[~cell_flag])
+
+    categorical = pd.DataFrame({'a': [1, 2, 2, np.nan, 3, 3],
+                                'b': [np.nan, 5, 5, 4, 4, np.nan]})
+    imputed = SimpleImputer(strategy='most_frequent').fit_transform(categorical)
+    assert isinstance(imputed, pd.DataFrame)
+    assert list(imputed['a']) == [1, 2, 2, 2, 3, 3]
+    assert list(imputed['b']) == [4, 5, 5, 4, 4, 4]
+
+    imputed = SimpleImputer(strategy='constant', fill_value=-1).fit_transform(
+        incomplete)
+    assert (imputed[cell_flag] == -1).all()
+
+
+def test_simple_imputer_in_place():
+
+    values = incomplete.astype('float32')
+    imputer = SimpleImputer(copy=False).fit(values)
+    imputed = imputer.transform(values)
+    assert imputed is values
+    assert imputed.dtype == np.float32
+    assert not np.isnan(values).any()
+
+    with pytest.raises(ValueError):
+        imputer.transform(values[:, :3])
+
+    # read-only views (e.g. DataFrames with copy-on-write) are copied instead
+    frame = pd.DataFrame(incomplete)
+    for imputer in (SimpleImputer(copy=False), RegressionImputer(copy=False),
+                    KNNImputer(copy=False), OrderedImputer(copy=False),
+                    HotDeckImputer(copy=False), SoftImputer(copy=False)):
+        imputed = imputer.fit_transform(frame)
+        assert isinstance(imputed, pd.DataFrame)
+        assert imputed.index.equals(frame.index)
+        assert np.allclose(imputed.to_numpy()[~cell_flag], complete[~cell_flag])
+    read_only = incomplete.copy()
+    read_only.flags.writeable = False
+    assert not np.isnan(SimpleImputer(copy=False).fit_transform(read_only)).any()
+
+
+def test_regression_imputer():
+
+    with pytest.raises(ValueError):
+        RegressionImputer(max_iter=0)
+
+    imputer = RegressionImputer().fit(incomplete)
+    imputed = imputer.transform(incomplete)
+    assert np.array_equal(imputed[~cell_flag], complete[~cell_flag])
+
+    mean, cov = imputer.mean_, imputer.cov_
+    for row in np.flatnonzero(cell_flag.any(axis=1))[:25]:
+        miss, obs = cell_flag[row], ~cell_flag[row]
+        expected = mean[miss] + cov[np.ix_(miss, obs)] @ np.linalg.solve(
+            cov[np.ix_(obs, obs)], incomplete[row, obs] - mean[obs])
+        assert np.allclose(imputed[row, miss], expected)
+
+    # much closer to the truth than the column means
+    mean_imputed = SimpleImputer().fit_transform(incomplete)
+    assert np.abs(imputed - complete)[cell_flag].mean() < \
+           0.7 * np.abs(mean_imputed - complete)[cell_flag].mean()
+
+
+def test_knn_imputer():
+
+    # reference: full distance matrix, as in sklearn's nan_euclidean_distances
+    filled = np.where(cell_flag, 0.0, incomplete)
+    observed = (~cell_flag).astype(float)
+    num_common = observed @ observed.T
+    sq_dist = (filled ** 2) @ observed.T + observed @ (filled ** 2).T \
+              - 2 * filled @ filled.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dist = np.sqrt(np.maximum(sq_dist, 0) * num_cols / num_common)
+
+    expected = incomplete.copy()
+    for row, col in zip(*np.nonzero(cell_flag)):
+        donors = np.flatnonzero(~cell_flag[:, col])
+        nearest = donors[np.argsort(dist[row, donors], kind='stable')[:3]]
+        expected[row, col] = incomplete[nearest, col].mean()
+
+    for num_workers, max_memory in ((1, None), (3, 40000)):
+        imputer = KNNImputer(num_neighbors=3, max_memory=max_memory,
+                             num_workers=num_workers)
+        imputed = imputer.fit_transform(incomplete)
+        assert np.allclose(imputed, expected)
+
+
+def test_iterative_imputer():
+
+    # deterministic chains converge to the conditional means, as with EM
+    imputer = IterativeImputer(sample_posterior=False, max_iter=100, tol=1e-6)
+    imputed = imputer.fit_transform(incomplete)
+    assert imputer.n_iter_[0] < 100
+    assert np.allclose(imputed[~cell_flag], complete[~cell_flag])
+    rows, cols = np.nonzero(cell_flag)
+    assert np.allclose(imputer.imputations_[0], imputed[rows, cols], atol=1e-4)
+    expected = RegressionImputer().fit_transform(incomplete)
+    error = np.abs(imputed - complete)[cell_flag].mean()
+    assert error < 1.1 * np.abs(expected - complete)[cell_flag].mean()
+
+    # chains are reproducible, regardless of the number of worker processes
+    settings = dict(num_chains=4, max_iter=6, seed=7)
+    serial = IterativeImputer(num_workers=1, **settings).fit(incomplete)
+    parallel = IterativeImputer(num_workers=2, **settings).fit(incomplete)
+    assert serial.imputations_.shape == (4, cell_flag.sum())
+    assert np.array_equal(serial.imputations_, parallel.imputations_)
+    assert not np.allclose(serial.imputations_[0], serial.imputations_[1])
+    assert serial.chain_means_.shape == (4, 6, num_cols)
+    assert np.all(np.isfinite(serial.rhat_[cell_flag.any(axis=0)]))
+
+
+def test_soft_imputer():
+
+    low_rank = rng.randn(300, 3) @ rng.randn(3, 40) + 5
+    missing = rng.rand(*low_rank.shape) < 0.2
+    data = np.where(missing, np.nan, low_rank)
+
+    imputer = SoftImputer(shrinkage=[10.0, 1.0, 0.1], rank=5)
+    imputed = imputer.fit_transform(data)
+    assert np.array_equal(imputed[~missing], low_rank[~missing])
+    error = np.abs(imputed - low_rank)[missing].mean()
+    col_means = SimpleImputer().fit_transform(data)
+    assert error < 0.1 * np.abs(col_means - low_rank)[missing].mean()
+    assert np.allclose(imputer.shrinkage_path_, [10.0, 1.0, 0.1])
+    assert imputer.ranks_[0] == 3
+    # warm start along the path needs fewer iterations than starting over
+    cold = SoftImputer(shrinkage=0.1, rank=5).fit(data)
+    assert imputer.n_iter_[-1] < cold.n_iter_[0]
+
+    # new rows are fit to the components, over their observed values
+    new_rows = imputer.transform(data[:50])
+    assert np.abs(new_rows - low_rank[:50])[missing[:50]].mean() < 2 * error + 0.05
+
+    # no shrinkage, with fewer observed variables than components in some rows
+    unshrunk = SoftImputer(rank=20, shrinkage=0.0).fit(incomplete)
+    imputed = unshrunk.transform(incomplete)
+    assert np.all(np.isfinite(imputed))
+    assert np.array_equal(imputed[~cell_flag], incomplete[~cell_flag])
+
+
+def test_ordered_imputer():
+
+    # sensor-like series, with gaps of varying lengths
+    series = np.cumsum(rng.randn(500, 8), axis=0)
+    gaps = rng.rand(500, 8) < 0.05
+    for col in range(8):
+        start = rng.randint(0, 480)
+        gaps[start:start + rng.randint(1, 20), col] = True
+    gaps[:3, 0] = True
+    gaps[-4:, 1] = True
+    data = np.where(gaps, np.nan, series)
+    frame = pd.DataFrame(data, index=pd.date_range('2019-01-01', periods=500,
+                                                   freq='h'))
+
+    expected = {'linear': frame.interpolate(limit_area='inside').to_numpy(),
+                'ffill' : frame.ffill().to_numpy(),
+                'bfill' : frame.bfill().to_numpy()}
+    # gaps longer than 5 stay missing
+    starts, lengths, cols = missing_runs(data)
+    long_gaps = np.zeros_like(gaps)
+    for start, length, col in zip(starts, lengths, cols):
+        long_gaps[start:start + length, col] = length > 5
+
+    for method, filled in expected.items():
+        imputed = OrderedImputer(method=method).fit_transform(data)
+        assert np.allclose(imputed, filled, equal_nan=True)
+        limited = OrderedImputer(method=method, max_gap=5).fit_transform(frame)
+        assert np.allclose(limited, np.where(long_gaps, np.nan, filled),
+                           equal_nan=True)
+
+        # streaming over chunks gives the same, in the same order
+        imputer = OrderedImputer(method=method, max_gap=5).fit(frame)
+        bounds = np.r_[0, np.sort(rng.choice(np.arange(1, 500), 20, replace=False)),
+                       500]
+        chunks = [frame.iloc[bounds[ii]:bounds[ii + 1]]
+                  for ii in range(len(bounds) - 1)]
+        streamed = pd.concat(list(imputer.transform_chunks(chunks)))
+        assert streamed.index.equals(frame.index)
+        assert np.allclose(streamed, limited, equal_nan=True)
+
+
+def test_ordered_imputer_long_gaps(monkeypatch):
+
+    from missingdata.imputation import ordered
+
+    # long outage at the end of a column, and a column never observed
+    data = np.cumsum(rng.randn(20000, 5), axis=0)
+    data[2000:, 0] = np.nan
+    data[:, 1] = np.nan
+    data[rng.rand(*data.shape) < 0.01] = np.nan
+
+    # every cell is scanned once, however long the gaps left open are
+    num_scanned = list()
+    nearest_observed = ordered._nearest_observed
+
+    def counted(values, *args):
+        num_scanned.append(values.size)
+        return nearest_observed(values, *args)
+
+    monkeypatch.setattr(ordered, '_nearest_observed', counted)
+    monkeypatch.setattr(cfg, 'CHUNK_SIZE_BYTES', 2**20)
+    for method in ('linear', 'bfill'):
+        num_scanned.clear()
+        imputer = OrderedImputer(method=method).fit(data)
+        imputed = imputer.transform(data)
+        assert sum(num_scanned) == data.size
+        expected = pd.DataFrame(data).interpolate(limit_area='inside') \
+            if method == 'linear' else pd.DataFrame(data).bfill()
+        assert np.allclose(imputed, expected, equal_nan=True)
+
+        num_scanned.clear()
+        chunks = [data[start:start + 100] for start in range(0, len(data), 100)]
+        streamed = np.vstack(list(imputer.transform_chunks(chunks)))
+        assert sum(num_scanned) == data.size
+        assert np.allclose(streamed, imputed, equal_nan=True)
+
+
+def test_multiple_imputations():
+
+    frame = pd.DataFrame(incomplete, columns=list('abcdef'))
+    imputer = IterativeImputer(num_chains=5, max_iter=5, seed=3)
+    multiple = MultipleImputations.from_imputer(imputer, frame)
+    assert len(multiple) == 5
+    assert multiple.nbytes < 5 * complete.nbytes
+    # the data given is not kept around, besides the single copy of its values
+    frame_ref = weakref.ref(frame)
+    frame_index = frame.index
+    del frame
+    gc.collect()
+    assert frame_ref() is None
+
+    completed = list(multiple)
+    assert all(isinstance(one, pd.DataFrame) for one in completed)
+    assert completed[0].index.equals(frame_index)
+    assert np.allclose(completed[-1].to_numpy()[~cell_flag], complete[~cell_flag])
+    rows, cols = np.nonzero(cell_flag)
+    assert np.array_equal(completed[2].to_numpy()[rows, cols],
+                          imputer.imputations_[2])
+
+    # pooled from the imputed cells alone, or from completed datasets
+    def col_means(data):
+        return data.mean(axis=0), data.var(axis=0, ddof=1) / len(data)
+
+    compact = multiple.pooled_means()
+    materialized = multiple.pool(col_means)
+    for from_compact, from_completed in zip(compact, materialized):
+        assert np.allclose(from_compact, from_completed)
+    # imputations vary between chains, adding to the variance
+    assert np.all(np.isfinite(compact[2]) & (compact[2] > 0))
+
+    estimate, variance, dof = rubins_rules([1.0, 2.0, 3.0], [0.5, 0.5, 0.5])
+    assert estimate == 2.0 and np.isclose(variance, 0.5 + 4 / 3)
+    assert np.isclose(dof, 2 * (1 + 0.5 / (4 / 3)) ** 2)
+
+
+def test_hot_deck_imputer():
+
+    groups = rng.choice(['x', 'y', 'z'], num_rows)
+    # values identify the group, so donors can be traced back to it
+    group_values = {'x': 1.0, 'y': 2.0, 'z': 3.0}
+    data = np.tile(np.array([group_values[grp] for grp in groups])[:, np.newaxis],
+                   (1, num_cols)) + np.arange(num_cols) * 10
+    data[cell_flag] = np.nan
+    # no donors of the last variable in group z
+    data[groups == 'z', -1] = np.nan
+
+    imputer = HotDeckImputer(seed=1)
+    imputed = imputer.fit_transform(data, group_rows_by=groups)
+    assert not np.isnan(imputed).any()
+    expected = np.array([group_values[grp] for grp in groups])[:, np.newaxis] \
+               + np.arange(num_cols) * 10
+    within_groups = cell_flag.copy()
+    within_groups[groups == 'z', -1] = False
+    assert np.array_equal(imputed[within_groups], expected[within_groups])
+    assert np.isin(imputed[groups == 'z', -1], (51.0, 52.0)).all()
+
+    # reproducible, and every donor is an observed value of the variable
+    again = HotDeckImputer(seed=1).fit_transform(data, group_rows_by=groups)
+    assert np.array_equal(imputed, again)
+    pooled = imputer.transform(data)
+    rows, cols = np.nonzero(np.isnan(data))
+    assert all(np.isin(pooled[rows[cols == col], col], data[:, col]).all()
+               for col in range(num_cols))
+
+
+def test_partial_fit(monkeypatch):
+
+    # updates over several blocks of rows, within a small memory budget
+    monkeypatch.setattr(cfg, 'CHUNK_SIZE_BYTES', 2000)
+    batches = np.array_split(incomplete, 7)
+    observed = ~cell_flag
+
+    # partial_fit continues from fit, for both imputers
+    simple = SimpleImputer().fit(batches[0])
+    for batch in batches[1:]:
+        simple.partial_fit(batch)
+    assert np.allclose(simple.statistics_, np.nanmean(incomplete, axis=0))
+    with pytest.raises(ValueError):
+        SimpleImputer(strategy='median').partial_fit(incomplete)
+
+    regression = RegressionImputer().fit(batches[0])
+    for batch in batches[1:]:
+        regression.partial_fit(batch)
+    assert np.allclose(regression.mean_, np.nanmean(incomplete, axis=0))
+    # pairwise observed covariance
+    expected = pd.DataFrame(incomplete).cov().to_numpy()
+    assert np.allclose(regression.cov_, expected)
+    imputed = regression.transform(incomplete)
+    assert np.allclose(imputed[observed], complete[observed])
+    error = np.abs(imputed - complete)[cell_flag].mean()
+    col_means = SimpleImputer().fit_transform(incomplete)
+    assert error < 0.7 * np.abs(col_means - complete)[cell_flag].mean()
+
+    # or from scratch, and fit resets the moments
+    fresh = RegressionImputer()
+    for batch in batches:
+        fresh.partial_fit(batch)
+    assert np.allclose(fresh.cov_, expected)
+    fresh.fit(batches[0]).partial_fit(batches[1])
+    seen = observed[:len(batches[0]) + len(batches[1])].astype(float)
+    assert np.array_equal(fresh.moments_.count, seen.T @ seen)
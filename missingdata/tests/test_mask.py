@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the missingness mask and the filters working on it."""
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import numpy as np
+import pandas as pd
+
+from missingdata.base import blackholes, freq_filter, reorder_cols
+from missingdata.mask import MissingnessMask, PackedMissingnessMask
+
+rng = np.random.RandomState(342)
+num_rows, num_cols = 150, 40
+data = rng.randn(num_rows, num_cols)
+data[rng.rand(num_rows, num_cols) < 0.1] = np.nan
+df = pd.DataFrame(data)
+cell_flag = np.isnan(data)
+
+
+def test_mask_counts():
+
+    mask = MissingnessMask.from_data(df)
+    assert mask.shape == (num_rows, num_cols)
+    assert np.array_equal(mask.row_counts, cell_flag.sum(axis=1))
+    assert np.array_equal(mask.col_counts, cell_flag.sum(axis=0))
+    assert np.allclose(mask.row_freq, cell_flag.mean(axis=1))
+
+    row_idx = rng.permutation(num_rows)[:50]
+    col_idx = rng.permutation(num_cols)[:10]
+    sub = cell_flag[np.ix_(row_idx, col_idx)]
+    assert np.array_equal(mask.to_array(row_idx, col_idx), sub)
+    row_counts, col_counts = mask.counts(row_idx, col_idx)
+    assert np.array_equal(row_counts, sub.sum(axis=1))
+    assert np.array_equal(col_counts, sub.sum(axis=0))
+
+
+def test_freq_filter_indices():
+
+    mask, row_idx, col_idx = freq_filter(df, (0.1, 1.0), (0.0, 1.0))
+    assert np.array_equal(row_idx, np.flatnonzero(cell_flag.mean(axis=1) >= 0.1))
+    assert np.array_equal(col_idx, np.arange(num_cols))
+
+    # mask is reused, not recomputed
+    same_mask, _, _ = freq_filter(mask, (0.1, 1.0), (0.0, 1.0))
+    assert same_mask is mask
+
+
+def test_blackholes_from_mask():
+
+    groups = rng.choice(['a', 'b', 'c'], num_rows)
+    mask = MissingnessMask.from_data(df)
+    fig, ax_frame, *_ = blackholes(mask, group_rows_by=groups, packed_mask=True)
+    frame = ax_frame.images[0].get_array()
+    assert frame.dtype == np.uint8
+    assert frame.shape == \
+           (np.count_nonzero(mask.row_counts), np.count_nonzero(mask.col_counts))
+
+
+def test_packed_mask():
+
+    mask = MissingnessMask.from_data(df)
+    packed = PackedMissingnessMask.from_data(df)
+    assert packed.packed.nbytes == num_rows * ((num_cols + 7) // 8)
+    assert np.array_equal(packed.row_counts, mask.row_counts)
+    assert np.array_equal(packed.col_counts, mask.col_counts)
+    assert np.array_equal(packed.to_array(), cell_flag)
+
+    row_idx = rng.permutation(num_rows)[:70]
+    col_idx = rng.permutation(num_cols)[:13]
+    assert np.array_equal(packed.to_array(row_idx, col_idx),
+                          cell_flag[np.ix_(row_idx, col_idx)])
+    assert np.array_equal(packed.counts(row_idx, col_idx)[1],
+                          mask.counts(row_idx, col_idx)[1])
+
+    reordered, _ = reorder_cols(packed, np.arange(num_cols), col_idx)
+    assert isinstance(reordered, PackedMissingnessMask)
+    assert np.array_equal(reordered.to_array(), cell_flag[:, col_idx])
+    assert np.array_equal(reordered.col_counts, cell_flag[:, col_idx].sum(axis=0))
+
+
+def test_filter_spec_callables():
+
+    freq = cell_flag.mean(axis=1)
+    expected = np.flatnonzero((freq < 0.05) | (freq > 0.15))
+
+    def array_aware(perc):
+        return (perc < 0.05) | (perc > 0.15)
+
+    def scalar_only(perc):
+        return (perc < 0.05) or (perc > 0.15)
+
+    for spec in (array_aware, scalar_only):
+        _, row_idx, _ = freq_filter(df, spec, (0.0, 1.0))
+        assert np.array_equal(row_idx, expected)
+
+
+def test_top_k_and_quantile_specs():
+
+    mask = MissingnessMask.from_data(df)
+    _, row_idx, col_idx = freq_filter(mask, ('top', 20), ('bottom', 5))
+    assert len(row_idx) == 20 and len(col_idx) == 5
+    assert mask.row_counts[row_idx].min() >= np.sort(mask.row_counts)[-20]
+    assert mask.col_counts[col_idx].max() <= np.sort(mask.col_counts)[4]
+
+    _, row_idx, _ = freq_filter(mask, ('quantile', (0.25, 0.75)), (0.0, 1.0))
+    low, high = np.quantile(mask.row_freq, (0.25, 0.75))
+    expected = (mask.row_freq >= low) & (mask.row_freq <= high)
+    assert np.array_equal(row_idx, np.flatnonzero(expected))
+
+
+def test_block_reduce():
+
+    mask = MissingnessMask.from_data(df)
+    blocks = mask.block_reduce(out_shape=(15, 8), reduction='fraction')
+    assert blocks.shape == (15, 8)
+    expected = cell_flag.reshape(15, 10, 8, 5).mean(axis=(1, 3))
+    assert np.allclose(blocks, expected)
+
+    any_missing = mask.pack().block_reduce(out_shape=(15, 8), reduction='any')
+    assert np.array_equal(any_missing, expected > 0)
+
+    # axes smaller than the output are not binned
+    assert mask.block_reduce(np.arange(10), None, (15, 8)).shape == (10, 8)
+
+
+def test_blackholes_downsampled():
+
+    big = rng.rand(5000, 300) < 0.01
+    fig, ax_frame, *_ = blackholes(MissingnessMask(big), downsample='fraction',
+                                   figsize=(1, 1))
+    frame = ax_frame.images[0].get_array()
+    assert frame.shape[0] < big.shape[0] and frame.shape[1] < big.shape[1]
+    assert np.isclose(frame.mean(), big[big.any(axis=1)].mean(), rtol=0.05)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the pairwise (co-missing) relations in missingness."""
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import numpy as np
+import pandas as pd
+
+from missingdata.base import blackholes, comissing
+from missingdata.mask import MissingnessMask
+from missingdata.ordering import cluster_order, pattern_order, spectral_order
+from missingdata.pairwise import co_missing_blocked, co_missing_counts, \
+    co_missing_nearest, nullity_correlation
+
+rng = np.random.RandomState(654)
+num_rows, num_cols = 123, 37
+cell_flag = rng.rand(num_rows, num_cols) < 0.2
+mask = MissingnessMask(cell_flag)
+flags = cell_flag.astype('int64')
+
+
+def test_co_missing_counts():
+
+    for method in ('matmul', 'popcount'):
+        assert np.array_equal(co_missing_counts(mask, method=method), flags.T @ flags)
+        assert np.array_equal(co_missing_counts(mask, axis='subjects', method=method),
+                              flags @ flags.T)
+
+    row_idx, col_idx = np.arange(3, 100, 2), np.arange(0, num_cols, 3)
+    sub = flags[np.ix_(row_idx, col_idx)]
+    assert np.array_equal(co_missing_counts(mask, row_idx, col_idx, method='popcount'),
+                          sub.T @ sub)
+
+
+def test_comissing_plot():
+
+    data = pd.DataFrame(np.where(cell_flag, np.nan, 1.0))
+    fig, ax, co_missing = comissing(data, filter_spec_variables=('top', 10))
+    assert co_missing.shape == (10, 10)
+    assert np.array_equal(np.sort(np.diag(co_missing)),
+                          np.sort(cell_flag.sum(axis=0))[-10:])
+
+
+def test_co_missing_blocked(tmp_path):
+
+    out_path = str(tmp_path / 'co_missing.npy')
+    counts = co_missing_blocked(mask, out_path, block_size=17)
+    assert np.array_equal(counts, flags @ flags.T)
+    assert np.array_equal(np.load(out_path, mmap_mode='r'), flags @ flags.T)
+
+    fig, ax, on_disk = comissing(mask, filter_spec_samples=(0.0, 1.0),
+                                 axis='subjects', out_file=out_path, figsize=(0.2, 0.2))
+    assert ax.images[0].get_array().shape == (60, 60)
+
+
+def test_co_missing_nearest():
+
+    common = flags @ flags.T
+    counts = flags.sum(axis=1)
+    jaccard = common / np.maximum(counts[:, None] + counts[None, :] - common, 1)
+    np.fill_diagonal(jaccard, -np.inf)
+
+    nearest, scores = co_missing_nearest(mask, 5, block_size=20)
+    assert nearest.shape == scores.shape == (num_rows, 5)
+    assert not (nearest == np.arange(num_rows)[:, None]).any()
+    assert np.allclose(scores, -np.sort(-jaccard, axis=1)[:, :5])
+    assert np.allclose(np.take_along_axis(jaccard, nearest, axis=1), scores)
+
+
+def test_nullity_correlation_and_cluster_order():
+
+    # two blocks of variables, each missing together
+    block_flags = np.zeros((num_rows, 6), dtype=bool)
+    block_flags[rng.rand(num_rows) < 0.3, ::2] = True
+    block_flags[rng.rand(num_rows) < 0.3, 1::2] = True
+    block_flags ^= rng.rand(num_rows, 6) < 0.02
+
+    phi = nullity_correlation(MissingnessMask(block_flags))
+    assert np.allclose(phi, np.corrcoef(block_flags.T))
+
+    order = cluster_order(MissingnessMask(block_flags))
+    assert set(order[:3]) in ({0, 2, 4}, {1, 3, 5})
+
+    fig, ax_frame, *_ = blackholes(MissingnessMask(block_flags), order_cols_by='cluster',
+                                   label_cols_with=list('abcdef'))
+    labels = [lbl.get_text() for lbl in fig.axes[2].get_xticklabels()]
+    assert set(labels[:3]) in ({'a', 'c', 'e'}, {'b', 'd', 'f'})
+
+
+def test_row_seriation():
+
+    patterns = rng.rand(6, num_cols) < 0.4
+    pattern_flags = patterns[rng.randint(0, 6, 2000)]
+    pattern_mask = MissingnessMask(pattern_flags)
+
+    for order in (pattern_order(pattern_mask),
+                  spectral_order(pattern_mask, sample_size=500)):
+        assert np.array_equal(np.sort(order), np.arange(2000))
+        # rows of the same pattern form contiguous stripes
+        reordered = pattern_flags[order]
+        num_changes = (reordered[1:] != reordered[:-1]).any(axis=1).sum()
+        assert num_changes <= 5 or num_changes < 0.01 * len(order)
+
+    num_missing = pattern_flags[pattern_order(pattern_mask)].sum(axis=1)
+    assert (np.diff(num_missing) <= 0).all()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the patterns of missingness."""
+
+import numpy as np
+
+from missingdata.mask import MissingnessMask
+from missingdata.patterns import missingness_patterns, rows_by_pattern
+
+rng = np.random.RandomState(1234)
+num_rows, num_cols = 500, 19
+base_patterns = rng.rand(12, num_cols) < 0.3
+cell_flag = base_patterns[rng.randint(0, 12, num_rows)]
+
+
+def test_patterns():
+
+    patterns, counts, pattern_index = missingness_patterns(MissingnessMask(cell_flag))
+    expected, expected_counts = np.unique(cell_flag, axis=0, return_counts=True)
+    assert len(patterns) == len(expected)
+    assert counts.sum() == num_rows
+    assert (np.diff(counts) <= 0).all()
+    assert np.array_equal(patterns[pattern_index], cell_flag)
+    assert np.array_equal(np.sort(counts), np.sort(expected_counts))
+
+    row_order, boundaries = rows_by_pattern(pattern_index, len(patterns))
+    for pp in range(len(patterns)):
+        rows = row_order[boundaries[pp]:boundaries[pp + 1]]
+        assert len(rows) == counts[pp]
+        assert (cell_flag[rows] == patterns[pp]).all()
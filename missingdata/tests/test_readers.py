@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the readers building missingness masks from files."""
+
+from os.path import dirname, join as pjoin, realpath
+
+import numpy as np
+import pandas as pd
+
+from missingdata.readers import read_csv_mask
+
+data_dir = pjoin(dirname(realpath(__file__)), '..', '..', 'datasets', 'OpenMV')
+
+
+def test_csv_mask_matches_pandas():
+
+    path = pjoin(data_dir, 'kamyr-digester.csv')
+    df = pd.read_csv(path)
+    for chunk_size in (None, 512):
+        for packed in (False, True):
+            mask, col_labels, row_labels = read_csv_mask(path, label_col='Observation',
+                                                         packed=packed,
+                                                         chunk_size=chunk_size)
+            assert np.array_equal(mask.to_array(), df.iloc[:, 1:].isnull().values)
+            assert list(col_labels) == list(df.columns[1:])
+            assert list(row_labels) == list(df['Observation'])
+
+
+def test_csv_mask_tokens_and_quotes(tmp_path):
+
+    path = tmp_path / 'tokens.csv'
+    path.write_text('id,a,b\r\n"x, 1",NA,3\r\n\r\ny,,null\r\nz,1.5,"2"')
+    mask, col_labels, row_labels = read_csv_mask(str(path), label_col=0)
+    assert list(col_labels) == ['a', 'b']
+    assert list(row_labels) == ['x, 1', 'y', 'z']
+    assert np.array_equal(mask.to_array(), [[True, False], [True, True], [False, False]])
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the statistics characterizing the type of missingness."""
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from missingdata.stats import _initial_estimates, em_mvn, little_mcar_test, \
+    mar_screen
+
+rng = np.random.RandomState(2019)
+num_rows, num_cols = 300, 4
+chol = rng.randn(num_cols, num_cols)
+complete = rng.randn(num_rows, num_cols) @ chol + np.arange(num_cols)
+
+mcar = complete.copy()
+mcar[rng.rand(num_rows, num_cols) < 0.15] = np.nan
+mcar[np.isnan(mcar).all(axis=1), 0] = complete[np.isnan(mcar).all(axis=1), 0]
+
+
+def naive_em(values, num_iter):
+    """EM with one iteration over rows per step, as a reference."""
+
+    cell_flag = np.isnan(values)
+    mean, cov = _initial_estimates(values)
+    for _ in range(num_iter):
+        total, total_prods = np.zeros(num_cols), np.zeros((num_cols, num_cols))
+        for row, missing in zip(values, cell_flag):
+            obs, row, cond_cov = ~missing, row.copy(), np.zeros((num_cols, num_cols))
+            if missing.any():
+                coef = np.linalg.solve(cov[np.ix_(obs, obs)], cov[np.ix_(obs, missing)])
+                row[missing] = mean[missing] + coef.T @ (row[obs] - mean[obs])
+                cond_cov[np.ix_(missing, missing)] = cov[np.ix_(missing, missing)] \
+                                                     - cov[np.ix_(obs, missing)].T @ coef
+            total += row
+            total_prods += np.outer(row, row) + cond_cov
+        mean = total / num_rows
+        cov = total_prods / num_rows - np.outer(mean, mean)
+
+    return mean, cov
+
+
+def test_em_matches_row_wise():
+
+    mean, cov, num_iter, converged = em_mvn(mcar, max_iter=20, tol=0.0)
+    assert num_iter == 20 and not converged
+    ref_mean, ref_cov = naive_em(mcar, 20)
+    assert np.allclose(mean, ref_mean)
+    assert np.allclose(cov, ref_cov)
+
+
+def test_em_warm_start():
+
+    mean, cov, cold_iter, converged = em_mvn(mcar, tol=1e-8)
+    assert converged
+    # more data of the same kind: starting from the previous fit saves iterations
+    more = np.vstack((mcar, mcar[::-1] + 0.01))
+    cold = em_mvn(more, tol=1e-8)
+    warm = em_mvn(more, mean=mean, cov=cov, tol=1e-8)
+    assert warm[2] < cold[2]
+    assert np.allclose(warm[0], cold[0], atol=1e-6)
+    assert np.allclose(warm[1], cold[1], atol=1e-6)
+
+    with pytest.raises(ValueError):
+        em_mvn(mcar, max_iter=0)
+
+
+def test_little_mcar():
+
+    _, dof, p_mcar = little_mcar_test(mcar)
+    assert dof > 0
+    assert p_mcar > 0.01
+
+    # missing depending on the value of another variable
+    mar = complete.copy()
+    mar[complete[:, 0] > np.median(complete[:, 0]), 1] = np.nan
+    statistic, dof, p_mar = little_mcar_test(mar)
+    assert dof == 3
+    assert p_mar < 1e-6
+
+    # singular covariance, with constant and collinear variables
+    singular = np.hstack((mcar, np.ones((num_rows, 1)), 2 * complete[:, :1]))
+    singular[rng.rand(num_rows) < 0.1, -1] = np.nan
+    statistic, dof, p_value = little_mcar_test(singular)
+    assert np.isfinite(statistic) and 0 <= p_value <= 1
+
+    all_missing = mcar.copy()
+    all_missing[:, 2] = np.nan
+    with pytest.raises(ValueError):
+        little_mcar_test(all_missing)
+    with pytest.raises(ValueError):
+        em_mvn(all_missing)
+
+
+def test_mar_screen():
+
+    mar = complete.copy()
+    mar[complete[:, 0] > np.median(complete[:, 0]), 1] = np.nan
+    mar[rng.rand(num_rows) < 0.1, 3] = np.nan
+    statistic, p_value = mar_screen(mar)
+    assert statistic.shape == p_value.shape == (num_cols, num_cols)
+    assert np.isnan(np.diag(statistic)).all()
+
+    for ind in (1, 3):
+        for var in range(num_cols):
+            if var == ind:
+                continue
+            missing = np.isnan(mar[:, ind]) & ~np.isnan(mar[:, var])
+            observed = ~np.isnan(mar[:, ind]) & ~np.isnan(mar[:, var])
+            ref = stats.ttest_ind(mar[missing, var], mar[observed, var],
+                                  equal_var=False)
+            assert np.isclose(statistic[ind, var], ref.statistic)
+            assert np.isclose(p_value[ind, var], ref.pvalue)
+
+    # missingness in var 1 depends on var 0
+    assert p_value[1, 0] < 1e-6
+    # no missing values in var 0, so nothing to test
+    assert np.isnan(p_value[0]).all()
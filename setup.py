@@ -9,7 +9,8 @@ import versioneer
 requirements = ['numpy',
                 'pandas',
                 'xlrd',
-                'matplotlib']
+                'matplotlib',
+                'scipy']
 
 setup(
     author="Pradeep Reddy Raamana",
@@ -35,7 +36,7 @@ setup(
     name='missingdata',
     version=versioneer.get_version(),
     cmdclass=versioneer.get_cmdclass(),
-    packages=find_packages(include=['missingdata']),
+    packages=find_packages(include=['missingdata', 'missingdata.*']),
     setup_requires=requirements,
     test_suite='tests',
     tests_require=requirements,